@@ -2,29 +2,42 @@ from sawtooth_sdk.processor.core import TransactionProcessor
 from sawtooth_sdk.processor.handler import TransactionHandler
 from sawtooth_sdk.processor.exceptions import InvalidTransaction
 
-from src.exceptions import *
+from src import codec
+from src import metrics
+from src.context import TimedContext
+from src.addressing import FAMILY_NAME, FAMILY_PREFIX, get_address, shard_addresses
 
-import json
-import hashlib
 from collections.abc import MutableSequence
 import struct
+import time
+
+import argparse
+import multiprocessing
+import os
 
 import constant
 import logging
 
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler()
-fmt = "%(asctime)s - %(levelname)s -- %(message)s"
-handler.setFormatter(logging.Formatter(fmt))
-handler.setLevel(logging.DEBUG)
-logger.addHandler(handler)
-logger.setLevel(logging.DEBUG)
+
+DECODE_SECONDS = metrics.histogram("tp_decode_seconds", "Time to decode a transaction payload.")
+
+
+def configure_logging(level=logging.INFO):
+    "Log to stderr at @level; per-operation messages are DEBUG and are not even formatted above it."
+    handler = logging.StreamHandler()
+    fmt = "%(asctime)s - %(process)d - %(levelname)s -- %(message)s"
+    handler.setFormatter(logging.Formatter(fmt))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
 
 
 class TransferTransactionHandler(TransactionHandler):
     def __init__(self):
-        self._family_name = "bank"
-        self._namespace_prefix = hashlib.sha512(self._family_name.encode()).hexdigest()[:constant.ADDRESS_PREFIX_LEN]
+        self._family_name = FAMILY_NAME
+        self._namespace_prefix = FAMILY_PREFIX
+        self._op_metrics = {}
 
     @property
     def family_name(self):
@@ -32,7 +45,7 @@ class TransferTransactionHandler(TransactionHandler):
 
     @property
     def family_versions(self):
-        return ["1.1"]
+        return ["1.1", "1.2"]
 
     @property
     def namespaces(self):
@@ -46,9 +59,9 @@ class TransferTransactionHandler(TransactionHandler):
             "name": account_name,
             "balance": balance,
         }
-        data = {account_address: json.dumps(init_value).encode()}
+        data = {account_address: codec.encode_account(init_value, payload["version"])}
         context.set_state(data, timeout=constant.TXTIMEOUT)
-        logger.info(f"Account {account_name} with initial balance {balance} created.")
+        logger.debug("Account %s with initial balance %s created.", account_name, balance)
 
     def transfer(self, payload, context):
         sender_name = payload["sender"]
@@ -56,20 +69,54 @@ class TransferTransactionHandler(TransactionHandler):
         sender_address = self.get_address(sender_name)
         receiver_address = self.get_address(receiver_name)
         amount = payload["amount"]
-        sender = context.get_state([sender_address])[0]
-        sender = json.loads(sender.data)
+        if amount <= 0:
+            raise InvalidTransaction(f"Amount must be positive, got {amount}.")
+        if sender_address == receiver_address:
+            raise InvalidTransaction(f"Account {sender_name} cannot transfer to itself.")
+        accounts = self.get_data([sender_address, receiver_address], context)
+        try:
+            sender = accounts[sender_address]
+            receiver = accounts[receiver_address]
+        except KeyError:
+            raise InvalidTransaction(f"Account {sender_name} or {receiver_name} does not exist.")
         sender_balance = sender["balance"]
         if sender_balance < amount:
-            raise OutOfBalanceError(f"Account {sender.name} does not have enough money (${sender_balance}) to transfer (${amount}). ")
-        receiver = context.get_state([receiver_address])[0]
-        receiver = json.loads(receiver.data)
+            raise InvalidTransaction(f"Account {sender_name} does not have enough money (${sender_balance}) to transfer (${amount}). ")
         sender["balance"] -= amount
         receiver["balance"] += amount
         context.set_state({
-            sender_address: json.dumps(sender).encode(),
-            receiver_address: json.dumps(receiver).encode(),
+            sender_address: codec.encode_account(sender, payload["version"]),
+            receiver_address: codec.encode_account(receiver, payload["version"]),
         }, timeout=constant.TXTIMEOUT)
-        logger.info(f"Transfer from {sender_name} to {receiver_name} with amount {amount} succeeded.")
+        logger.debug("Transfer from %s to %s with amount %s succeeded.", sender_name, receiver_name, amount)
+
+    def multi_transfer(self, payload, context):
+        "Debit one sender and credit every receiver in @payload['receivers'] atomically."
+        sender_name = payload["sender"]
+        sender_address = self.get_address(sender_name)
+        credits = {}
+        total = 0
+        for receiver_name, amount in payload["receivers"]:
+            if amount <= 0:
+                raise InvalidTransaction(f"Amount to {receiver_name} must be positive, got {amount}.")
+            receiver_address = self.get_address(receiver_name)
+            credits[receiver_address] = credits.get(receiver_address, 0) + amount
+            total += amount
+        if sender_address in credits:
+            raise InvalidTransaction(f"Account {sender_name} cannot transfer to itself.")
+        accounts = self.get_data([sender_address, *credits], context)
+        if len(accounts) != len(credits) + 1:
+            raise InvalidTransaction(f"Account {sender_name} or one of its receivers does not exist.")
+        sender = accounts[sender_address]
+        if sender["balance"] < total:
+            raise InvalidTransaction(f"Account {sender_name} does not have enough money (${sender['balance']}) to transfer (${total}). ")
+        sender["balance"] -= total
+        for receiver_address, amount in credits.items():
+            accounts[receiver_address]["balance"] += amount
+        context.set_state({
+            address: codec.encode_account(account, payload["version"]) for address, account in accounts.items()
+        }, timeout=constant.TXTIMEOUT)
+        logger.debug("Transfer from %s to %d receivers with amount %s succeeded.", sender_name, len(credits), total)
 
     def change(self, payload, context):
         account_name = payload["name"]
@@ -88,10 +135,10 @@ class TransferTransactionHandler(TransactionHandler):
             prep = "from"
         account_data["balance"] += amount
         data = {
-            account_address: json.dumps(account_data).encode(),
+            account_address: codec.encode_account(account_data, payload["version"]),
         }
         context.set_state(data, timeout=constant.TXTIMEOUT)
-        logger.info(f"{operation} amount {abs_amount} {prep} account {account_name} succeeded.")
+        logger.debug("%s amount %s %s account %s succeeded.", operation, abs_amount, prep, account_name)
 
     def query(self, payload, context):
         account_name = payload["name"]
@@ -102,15 +149,101 @@ class TransferTransactionHandler(TransactionHandler):
         except KeyError:
             raise InvalidTransaction(f"Key {key} does not exist in account {account_name}.")
         else:
-            value_bytes = struct.pack("<I", value)
+            value_bytes = struct.pack("<I" if payload["version"] == "1.1" else "<q", value)
             context.add_receipt_data(value_bytes, timeout=constant.TXTIMEOUT)
-        logger.info(f"Query {key} from {account_name} got value {value}")
+        logger.debug("Query %s from %s got value %s", key, account_name, value)
 
     def purge(self, payload, context):
         account_name = payload["name"]
         account_address = self.get_address(account_name)
         context.delete_state([account_address], timeout=constant.TXTIMEOUT)
-        logger.info(f"Account {account_name} is purged successfully!")
+        logger.debug("Account %s is purged successfully!", account_name)
+
+    def sharded_change(self, payload, context):
+        "Credit shard @payload['shard'] of a sharded account, or debit the sum of its @payload['shards'] shards."
+        amount = payload["amount"]
+        if amount >= 0:
+            self.credit_shard(payload["name"], payload["shard"], amount, payload["version"], context)
+        else:
+            self.debit_shards(payload["name"], payload["shards"], -amount, payload["version"], context)
+
+    def sharded_transfer(self, payload, context):
+        "Debit the sender across its @payload['shards'] shards and credit shard @payload['shard'] of the receiver."
+        amount = payload["amount"]
+        if amount <= 0:
+            raise InvalidTransaction(f"Amount must be positive, got {amount}.")
+        self.debit_shards(payload["sender"], payload["shards"], amount, payload["version"], context)
+        self.credit_shard(payload["receiver"], payload["shard"], amount, payload["version"], context)
+        logger.debug("Transfer from %s to %s with amount %s succeeded.", payload["sender"], payload["receiver"], amount)
+
+    def sharded_query(self, payload, context):
+        "Like `query`, with the balance summed over @payload['shards'] shards."
+        account_name = payload["name"]
+        key = payload["key"]
+        accounts = self.get_shards(account_name, payload["shards"], context)
+        primary = accounts[get_address(account_name)]
+        if key == "balance":
+            value = sum(account["balance"] for account in accounts.values())
+        elif key in primary:
+            value = primary[key]
+        else:
+            raise InvalidTransaction(f"Key {key} does not exist in account {account_name}.")
+        value_bytes = struct.pack("<I" if payload["version"] == "1.1" else "<q", value)
+        context.add_receipt_data(value_bytes, timeout=constant.TXTIMEOUT)
+        logger.debug("Query %s from %s got value %s", key, account_name, value)
+
+    def sharded_purge(self, payload, context):
+        account_name = payload["name"]
+        context.delete_state(list(self.get_shard_addresses(account_name, payload["shards"])), timeout=constant.TXTIMEOUT)
+        logger.debug("Account %s is purged successfully!", account_name)
+
+    def credit_shard(self, name, shard, amount, version, context):
+        "Add @amount to shard @shard of account @name, creating the shard on its first credit."
+        if not 0 <= shard < constant.MAX_SHARDS:
+            raise InvalidTransaction(f"Shard index must be below {constant.MAX_SHARDS}, got {shard}.")
+        address = get_address(name)
+        shard_address = self.get_shard_addresses(name, shard + 1)[shard]
+        accounts = self.get_data([address, shard_address], context)
+        if address not in accounts:
+            raise InvalidTransaction(f"Account {name} does not exist.")
+        account = accounts.get(shard_address, {"name": name, "balance": 0})
+        account["balance"] += amount
+        context.set_state({shard_address: codec.encode_account(account, version)}, timeout=constant.TXTIMEOUT)
+        logger.debug("Deposit amount %s to shard %s of account %s succeeded.", amount, shard, name)
+
+    def debit_shards(self, name, shards, amount, version, context):
+        """
+        Take @amount from the @shards shards of account @name, draining the fullest shards first
+        so as few shards as possible are written. Ties go by address, as every validator must agree.
+        """
+        accounts = self.get_shards(name, shards, context)
+        total = sum(account["balance"] for account in accounts.values())
+        if total < amount:
+            raise InvalidTransaction(f"Account {name} does not have enough money (${total}) to withdraw (${amount}). ")
+        updates = {}
+        remaining = amount
+        for address, account in sorted(accounts.items(), key=lambda item: (-item[1]["balance"], item[0])):
+            if remaining == 0:
+                break
+            taken = min(account["balance"], remaining)
+            account["balance"] -= taken
+            remaining -= taken
+            updates[address] = codec.encode_account(account, version)
+        context.set_state(updates, timeout=constant.TXTIMEOUT)
+        logger.debug("Withdraw amount %s from %d shards of account %s succeeded.", amount, len(updates), name)
+
+    def get_shards(self, name, shards, context):
+        "Return {address: account} of the existing shards of account @name, which must exist."
+        accounts = self.get_data(list(self.get_shard_addresses(name, shards)), context)
+        if get_address(name) not in accounts:
+            raise InvalidTransaction(f"Account {name} does not exist.")
+        return accounts
+
+    def get_shard_addresses(self, name, shards):
+        try:
+            return shard_addresses(name, shards)
+        except ValueError as e:
+            raise InvalidTransaction(str(e))
 
     def dispatch(self, operation, payload, context):
         "Dispatch transaction operations to instance methods and call with parameters @payload and @context."
@@ -123,45 +256,159 @@ class TransferTransactionHandler(TransactionHandler):
             %data:    target data
         """
         address = self.get_address(name)
-        return address, self.get_data(address, context)
+        data = self.get_data(address, context)
+        if data is None:
+            raise InvalidTransaction(f"Account {name} does not exist.")
+        return address, data
 
     def get_data(self, addresses, context):
+        """
+        Fetch @addresses with a single get_state call.
+        Return:
+            %data: {address: account} for a list of addresses, only those holding an account;
+                   the account itself for a single address, None if it holds nothing
+        """
         if isinstance(addresses, MutableSequence):
-            data = context.get_state(addresses)
-            return [json.loads[i.data] for i in data]
+            data = context.get_state(list(dict.fromkeys(addresses)))
+            return {entry.address: codec.decode_account(entry.data) for entry in data if entry.data}
         else:
-            data = context.get_state([addresses])[0].data
-            return json.loads(data)
+            data = context.get_state([addresses])
+            return codec.decode_account(data[0].data) if data and data[0].data else None
 
     def get_address(self, name):
-        return self._namespace_prefix + hashlib.sha512(name.encode()).hexdigest()[:constant.ADDRESS_SUFFIX_LEN]
+        return get_address(name)
 
     def apply(self, transaction, context):
         header = transaction.header
         payload = transaction.payload
         signature = transaction.signature
         context_id = transaction.context_id
-        payload = json.loads(payload.decode())
+        version = header.family_version
+        try:
+            with DECODE_SECONDS.time():
+                payload = codec.decode_payload(payload, version)
+        except ValueError as e:
+            raise InvalidTransaction(str(e))
+        payload["version"] = version
         operation = payload["typ"]
-        self.dispatch(operation, payload, context)
+        apply_seconds, applied, rejected = self.op_metrics(operation)
+        start = time.perf_counter()
+        try:
+            self.dispatch(operation, payload, TimedContext(context))
+        except Exception:
+            rejected.inc()
+            raise
+        else:
+            applied.inc()
+        finally:
+            apply_seconds.observe(time.perf_counter() - start)
+            metrics.profiler.tick()
 
-def install_tp():
-    url = "tcp://127.0.0.1:4004"
-    processor = TransactionProcessor(url=url)
+    def op_metrics(self, operation):
+        "Return the (latency histogram, ok counter, invalid counter) of @operation, resolved once."
+        try:
+            return self._op_metrics[operation]
+        except KeyError:
+            self._op_metrics[operation] = (
+                metrics.histogram("tp_apply_seconds", "Time to apply one operation.", op=operation),
+                metrics.counter("tp_transactions_total", "Transactions applied.", op=operation, status="ok"),
+                metrics.counter("tp_transactions_total", "Transactions applied.", op=operation, status="invalid"),
+            )
+            return self._op_metrics[operation]
+
+class BankTransactionProcessor(TransactionProcessor):
+    """
+    TransactionProcessor that registers with a bound on how many transactions the
+    validator may hand it at once (max_occupancy, 0 keeps the validator default).
+    """
+    def __init__(self, url, max_queue_size=0):
+        super().__init__(url=url)
+        self.max_queue_size = max_queue_size
+
+    def _register_requests(self):
+        for request in super()._register_requests():
+            request.max_occupancy = self.max_queue_size
+            yield request
+
+
+def install_tp(url=constant.VALIDATOR_URL, max_queue_size=0, log_level=logging.INFO,
+               metrics_path=None, metrics_interval=constant.METRICS_INTERVAL, profile=0, profile_out=constant.PROFILE_PATH):
+    configure_logging(log_level)
+    if metrics_path:
+        metrics.REGISTRY.export_every(metrics_path, metrics_interval)
+    if profile:
+        metrics.profiler.start(profile, profile_out)
+    processor = BankTransactionProcessor(url=url, max_queue_size=max_queue_size)
     handler = TransferTransactionHandler()
     processor.add_handler(handler)
     try:
-        print("Start")
+        logger.info("Start processor on %s", url)
         processor.start()
     except KeyboardInterrupt:
         pass
     except Exception as e:
-        print(e)
+        logger.error("Processor failed: %s", e)
     finally:
-        print("Stop")
+        logger.info("Stop")
         if processor is not None:
             processor.stop()
 
 
-install_tp()
+def per_worker(path, i):
+    "Suffix @path with the worker index, e.g. metrics.prom -> metrics-1.prom."
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{i}{ext}"
+
+
+def launch(url=constant.VALIDATOR_URL, workers=1, max_queue_size=0, log_level=logging.INFO,
+           metrics_path=None, metrics_interval=constant.METRICS_INTERVAL, profile=0, profile_out=constant.PROFILE_PATH):
+    """
+    Run @workers processor processes against the validator at @url. Each registers
+    separately, so the validator can dispatch transactions of parallel schedules to all of them.
+    Metrics and profile files get a per-worker suffix when there is more than one worker.
+    """
+    if workers == 1:
+        return install_tp(url, max_queue_size, log_level, metrics_path, metrics_interval, profile, profile_out)
+    processes = [
+        multiprocessing.Process(
+            target=install_tp,
+            args=(url, max_queue_size, log_level, per_worker(metrics_path, i), metrics_interval, profile, per_worker(profile_out, i)),
+            name=f"bank-tp-{i}",
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+parser = argparse.ArgumentParser(description="Transaction processor of the bank family")
+parser.add_argument("-C", "--connect", type=str, help="Validator endpoint, default to %(default)s.", default=constant.VALIDATOR_URL)
+parser.add_argument("-w", "--workers", type=int, help="Number of processor processes, default to %(default)s.", default=os.cpu_count())
+parser.add_argument("-q", "--max-queue-size", type=int, help="Transactions the validator may queue on each worker, 0 for the validator default.", default=0)
+parser.add_argument("-v", "--verbose", action="count", help="Increase log level, -v for DEBUG.", default=0)
+parser.add_argument("--metrics", type=str, help="Export metrics to this file, JSON if it ends in .json, Prometheus text otherwise.")
+parser.add_argument("--metrics-interval", type=float, help="Seconds between metrics exports, default to %(default)s.", default=constant.METRICS_INTERVAL)
+parser.add_argument("--profile", type=int, help="Profile the first N transactions with cProfile.", default=0)
+parser.add_argument("--profile-out", type=str, help="cProfile output file, default to %(default)s.", default=constant.PROFILE_PATH)
+
 
+if __name__ == "__main__":
+    args = parser.parse_args()
+    launch(
+        url=args.connect,
+        workers=args.workers,
+        max_queue_size=args.max_queue_size,
+        log_level=logging.DEBUG if args.verbose else logging.INFO,
+        metrics_path=args.metrics,
+        metrics_interval=args.metrics_interval,
+        profile=args.profile,
+        profile_out=args.profile_out,
+    )
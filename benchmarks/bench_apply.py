@@ -0,0 +1,92 @@
+"""
+apply() benchmark suite for TransferTransactionHandler on an in-memory context.
+
+Drives a seeded random mix of create/transfer/change/query/purge and reports overall
+transactions per second plus p50/p99 latency per operation type.
+
+Usage: python -m benchmarks.bench_apply [-n TRANSACTIONS] [-a ACCOUNTS] [-v VERSION]
+                                        [-m transfer=50,change=30,query=15,purge=5]
+"""
+import argparse
+import logging
+import random
+import time
+
+from bank_tp import TransferTransactionHandler
+from src import codec
+from src.context import MemoryContext, make_request
+
+DEFAULT_MIX = "transfer=50,change=30,query=15,purge=5"
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(","):
+        typ, weight = item.split("=")
+        weights[typ] = int(weight)
+    return weights
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def generate(n, n_accounts, weights, seed=0):
+    "Yield (op type, encoded payload); purged accounts are re-created right away."
+    rng = random.Random(seed)
+    accounts = [f"account-{i}" for i in range(n_accounts)]
+    for name in accounts:
+        yield "create", {"typ": "create", "name": name, "balance": 10 ** 9}
+    types = list(weights)
+    for typ in rng.choices(types, weights=[weights[t] for t in types], k=n):
+        name = rng.choice(accounts)
+        if typ == "transfer":
+            yield typ, {"typ": typ, "sender": name, "receiver": rng.choice(accounts), "amount": rng.randint(1, 100)}
+        elif typ == "multi_transfer":
+            receivers = rng.sample([account for account in accounts if account != name], 10)
+            yield typ, {"typ": typ, "sender": name, "receivers": [[receiver, rng.randint(1, 100)] for receiver in receivers]}
+        elif typ == "change":
+            yield typ, {"typ": typ, "name": name, "amount": rng.randint(-100, 100)}
+        elif typ == "query":
+            yield typ, {"typ": typ, "name": name, "key": "balance"}
+        elif typ == "purge":
+            yield typ, {"typ": typ, "name": name}
+            yield "create", {"typ": "create", "name": name, "balance": 10 ** 9}
+
+
+def run(n, n_accounts, weights, version):
+    handler = TransferTransactionHandler()
+    context = MemoryContext()
+    requests = [(typ, make_request(codec.encode_payload(op, version), version))
+                for typ, op in generate(n, n_accounts, weights)]
+    latencies = {}
+    start = time.perf_counter()
+    for typ, request in requests:
+        t0 = time.perf_counter_ns()
+        handler.apply(request, context)
+        latencies.setdefault(typ, []).append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - start
+    return len(requests) / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--transactions", type=int, default=20000)
+    parser.add_argument("-a", "--accounts", type=int, default=1000)
+    parser.add_argument("-v", "--version", default="1.2", help="Family version, default to %(default)s.")
+    parser.add_argument("-m", "--mix", default=DEFAULT_MIX, help="Operation weights, default to %(default)s.")
+    parser.add_argument("--log", action="store_true", help="Keep the handler's per-operation logging.")
+    args = parser.parse_args()
+    if not args.log:
+        logging.getLogger("bank_tp").setLevel(logging.WARNING)
+
+    tps, latencies = run(args.transactions, args.accounts, parse_mix(args.mix), args.version)
+    print(f"family version {args.version}: {tps:.0f} tx/s")
+    print(f"{'operation':<16}{'count':>8}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for typ, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{typ:<16}{len(values):>8}{percentile(values, 0.5) / 1e3:>12.1f}{percentile(values, 0.99) / 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+apply() throughput of TransferTransactionHandler for JSON (1.1) versus binary (1.2)
+payloads and account state, against an in-memory context.
+
+Usage: python -m benchmarks.bench_codec [-n TRANSACTIONS]
+"""
+import argparse
+import logging
+import time
+
+from bank_tp import TransferTransactionHandler
+from src import codec
+from src.context import MemoryContext, make_request
+
+
+def run(handler, version, n):
+    context = MemoryContext()
+    accounts = [f"account-{i}" for i in range(100)]
+    payloads = [codec.encode_payload({"typ": "create", "name": name, "balance": 10 ** 6}, version) for name in accounts]
+    for i in range(n):
+        payloads.append(codec.encode_payload({
+            "typ": "transfer",
+            "sender": accounts[i % 100],
+            "receiver": accounts[(i * 7 + 1) % 100],
+            "amount": 1,
+        }, version))
+    requests = [make_request(payload, version) for payload in payloads]
+    start = time.perf_counter()
+    for request in requests:
+        handler.apply(request, context)
+    elapsed = time.perf_counter() - start
+    state_size = sum(len(value) for value in context.state.values()) / len(context.state)
+    return len(requests) / elapsed, state_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--transactions", type=int, default=20000)
+    args = parser.parse_args()
+    logging.getLogger("bank_tp").setLevel(logging.WARNING)
+
+    handler = TransferTransactionHandler()
+    print(f"{'version':<9}{'tx/s':>12}{'state bytes/account':>22}")
+    for version in handler.family_versions:
+        tps, state_size = run(handler, version, args.transactions)
+        print(f"{version:<9}{tps:>12.0f}{state_size:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
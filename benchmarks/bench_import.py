@@ -0,0 +1,77 @@
+"""
+Import-time regression guard for the CLI.
+
+Runs a fresh interpreter with `-X importtime` for each target, reports the cumulative
+import time and the slowest modules, and exits non-zero if a target exceeds its budget
+or pulls in a heavy dependency it should load lazily.
+
+Usage: python -m benchmarks.bench_import [-b BUDGET_MS] [-r REPEAT] [-t TOP]
+"""
+import argparse
+import subprocess
+import sys
+
+# Modules that must not be imported just to build the CLI or list the local cache
+HEAVY = ("sawtooth_sdk", "sawtooth_signing", "google.protobuf", "requests", "zmq", "secp256k1", "numpy")
+
+TARGETS = {
+    "cli": "import src.cli",
+    "help": "import sys; sys.argv = ['main.py', '--help']\n"
+            "import main\ntry:\n    main.main()\nexcept SystemExit:\n    pass",
+}
+
+
+def import_times(code):
+    """
+    Return:
+        %times: {module: cumulative us} of one fresh interpreter running @code
+        %top_level: modules imported directly rather than by another import
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    top_level = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+        if not name[1:].startswith(" "):
+            top_level.add(name.strip())
+    return times, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-b", "--budget", type=float, default=100.0, help="Budget per target in ms, default to %(default)s.")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Runs per target, the fastest counts.")
+    parser.add_argument("-t", "--top", type=int, default=5, help="Slowest modules to show.")
+    args = parser.parse_args()
+
+    startup, _ = import_times("pass")
+    failed = False
+    for target, code in TARGETS.items():
+        totals = []
+        for _ in range(args.repeat):
+            times, top_level = import_times(code)
+            totals.append((sum(times[name] for name in top_level - set(startup)), times))
+        total, best = min(totals, key=lambda run: run[0])
+        best = {name: t for name, t in best.items() if name not in startup}
+        total_ms = total / 1e3
+        heavy = sorted(name for name in best if name.split(".")[0] in HEAVY or name in HEAVY)
+        status = "ok"
+        if total_ms > args.budget or heavy:
+            status = "FAIL"
+            failed = True
+        print(f"{target}: {total_ms:.1f} ms (budget {args.budget:.0f} ms) {status}")
+        for name, t in sorted(best.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {t / 1e3:8.1f} ms  {name}")
+        if heavy:
+            print(f"    heavy imports: {', '.join(heavy)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Transactions signed per second by a `BatchBuilder`, serially and on a `SigningPool`.
+
+Builds the same seeded mix of deposits and transfers (so later transactions depend on
+earlier ones) into batches for every worker count, checks the BatchList bytes are identical
+to the serial build and reports the throughput of each.
+
+Usage: python -m benchmarks.bench_sign_pool [-n TRANSACTIONS] [-a ACCOUNTS] [-w 1,2,4] [-c CHUNK]
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+from sawtooth_signing import create_context, CryptoFactory
+
+import constant
+from src.bulk import Account
+from src.signer import SigningPool
+from src.wallet import Operation
+
+
+def build(signer, ops, pool=None):
+    "Sign @ops into batches, return (BatchList bytes, seconds)."
+    oper = Operation(signer=signer, session=object())
+    oper.nonce_prefix = "bench."
+    start = time.perf_counter()
+    with oper.batch(autoflush=False, pool=pool) as builder:
+        for op, args in ops:
+            getattr(oper, op)(*args)
+    batches = oper.generate_batches(builder.sign(), builder.max_batch_size, pool)
+    elapsed = time.perf_counter() - start
+    return BatchList(batches=[batch for _, batch in batches]).SerializeToString(), elapsed
+
+
+def generate(n, n_accounts, seed=0):
+    rng = random.Random(seed)
+    accounts = [f"account-{i}" for i in range(n_accounts)]
+    for _ in range(n):
+        if rng.random() < 0.5:
+            yield "deposit", (rng.choice(accounts), rng.randint(1, 100))
+        else:
+            src, dst = rng.sample(accounts, 2)
+            yield "transfer_money", (Account(src), Account(dst), rng.randint(1, 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--transactions", type=int, default=10000)
+    parser.add_argument("-a", "--accounts", type=int, default=1000)
+    parser.add_argument("-w", "--workers", help="Comma separated worker counts, default to powers of two up to the CPU count.")
+    parser.add_argument("-c", "--chunk-size", type=int, default=constant.SIGN_CHUNK, help="Headers per work item, default to %(default)s.")
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(",")] if args.workers else \
+        [w for w in itertools.takewhile(lambda w: w < cpus, (2 ** i for i in itertools.count()))] + [cpus]
+
+    context = create_context('secp256k1')
+    signer = CryptoFactory(context).new_signer(context.new_random_private_key())
+    ops = list(generate(args.transactions, args.accounts))
+
+    expected, elapsed = build(signer, ops)
+    print(f"{'workers':<10}{'tx/s':>10}{'speedup':>10}  identical")
+    print(f"{'serial':<10}{len(ops) / elapsed:>10.0f}{1:>10.2f}  -")
+    for n in workers:
+        with SigningPool(signer, workers=n, chunk_size=args.chunk_size) as pool:
+            build(signer, ops[:pool.chunk_size * n], pool)  # Start the workers before timing
+            data, pooled = build(signer, ops, pool)
+        print(f"{n:<10}{len(ops) / pooled:>10.0f}{elapsed / pooled:>10.2f}  {'yes' if data == expected else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Per-command startup cost of the signing setup.
+
+"before" rebuilds a secp256k1 context and a random key for every `Operation`, as each
+`Wallet` used to; "after" reuses the process-wide signer from `get_signer`.
+`transfer` builds two wallets, so both columns are reported for one and two operations.
+
+Usage: python -m benchmarks.bench_signer [-n ROUNDS]
+"""
+import argparse
+import tempfile
+import timeit
+import pathlib
+
+from sawtooth_signing import create_context, CryptoFactory
+
+from src.signer import get_signer
+from src.wallet import Operation
+
+
+def fresh_signer():
+    context = create_context('secp256k1')
+    private_key = context.new_random_private_key()
+    return CryptoFactory(context).new_signer(private_key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    key_file = str(pathlib.Path(tempfile.mkdtemp()) / "bench.priv")
+    get_signer(key_file)  # First use pays for key generation once per process
+    cases = {
+        "before": lambda: Operation(signer=fresh_signer()),
+        "after": lambda: Operation(signer=get_signer(key_file)),
+    }
+    print(f"{'setup':<8}{'1 wallet (us)':>16}{'transfer (us)':>16}")
+    for label, build in cases.items():
+        per_op = timeit.timeit(build, number=args.rounds) / args.rounds * 1e6
+        print(f"{label:<8}{per_op:>16.1f}{2 * per_op:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+End-to-end load generator: N concurrent users drive `Operation` against a REST API.
+
+Without --url an in-process `src.devnet` stand-in is started, with the given commit latency
+and failure injection. Every user thread runs its own `Operation` and times each operation
+from signing to its batch settling, then throughput and latency percentiles are reported.
+
+Usage: python -m benchmarks.loadgen [-u USERS] [-d SECONDS] [-a ACCOUNTS] [--url URL]
+                                    [-l LATENCY] [--fail-rate P] [--invalid-rate P]
+                                    [-m deposit=40,withdraw=20,transfer=40]
+"""
+import argparse
+import collections
+import logging
+import random
+import threading
+import time
+
+from sawtooth_signing import create_context, CryptoFactory
+
+from benchmarks.bench_apply import parse_mix, percentile
+from src.bulk import Account
+from src.session import PooledSession
+from src.wallet import Operation
+
+DEFAULT_MIX = "deposit=40,withdraw=20,transfer=40"
+
+
+def fresh_signer():
+    context = create_context('secp256k1')
+    return CryptoFactory(context).new_signer(context.new_random_private_key())
+
+
+def setup(url, session, accounts, balance, timeout):
+    "Create @accounts in batches and wait for them to commit."
+    oper = Operation(signer=fresh_signer(), session=session, base_url=url, wait=False)
+    with oper.batch():
+        for name in accounts:
+            oper.create_account(name, balance)
+    statuses = oper.barrier(timeout)
+    committed = sum(status == "COMMITTED" for status in statuses.values())
+    if committed != len(statuses):
+        raise RuntimeError(f"Only {committed} of {len(statuses)} setup batches committed")
+
+
+def user(url, session, accounts, weights, deadline, timeout, seed, results):
+    "Issue operations of the @weights mix one at a time until @deadline, appending (op, status, seconds) to @results."
+    rng = random.Random(seed)
+    oper = Operation(signer=fresh_signer(), session=session, base_url=url, wait=False)
+    types = list(weights)
+    type_weights = [weights[typ] for typ in types]
+    while time.monotonic() < deadline:
+        typ = rng.choices(types, weights=type_weights)[0]
+        name = rng.choice(accounts)
+        start = time.perf_counter()
+        try:
+            if typ == "deposit":
+                oper.deposit(name, rng.randint(1, 100))
+            elif typ == "withdraw":
+                oper.withdraw(name, rng.randint(1, 100))
+            elif typ == "transfer":
+                oper.transfer_money(Account(name), Account(rng.choice(accounts)), rng.randint(1, 100))
+            status = next(iter(oper.barrier(timeout).values()), "UNKNOWN")
+        except Exception:
+            status = "FAILED"
+            for txids in oper.outstanding.values():
+                oper.settle(txids)
+            oper.outstanding.clear()
+        results.append((typ, status, time.perf_counter() - start))
+
+
+def run(url, n_users, duration, accounts, weights, timeout):
+    session = PooledSession(pool_size=n_users + 1)
+    setup(url, session, accounts, 10 ** 9, timeout)
+    results = []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=user, args=(url, session, accounts, weights, deadline, timeout, seed, results))
+        for seed in range(n_users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed):
+    statuses = collections.Counter(status for _, status, _ in results)
+    committed = statuses["COMMITTED"]
+    print(f"{len(results)} operations in {elapsed:.1f}s, {committed / elapsed:.0f} committed/s, "
+          + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    latencies = {}
+    for typ, status, seconds in results:
+        if status == "COMMITTED":
+            latencies.setdefault(typ, []).append(seconds)
+            latencies.setdefault("all", []).append(seconds)
+    print(f"{'operation':<12}{'count':>8}{'p50 (ms)':>12}{'p90 (ms)':>12}{'p99 (ms)':>12}{'max (ms)':>12}")
+    for typ, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{typ:<12}{len(values):>8}" + "".join(
+            f"{percentile(values, q) * 1e3:>12.1f}" for q in (0.5, 0.9, 0.99)
+        ) + f"{values[-1] * 1e3:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-u", "--users", type=int, default=8, help="Concurrent users, default to %(default)s.")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="Seconds to run, default to %(default)s.")
+    parser.add_argument("-a", "--accounts", type=int, default=100, help="Accounts created up front, default to %(default)s.")
+    parser.add_argument("-m", "--mix", default=DEFAULT_MIX, help="Operation weights, default to %(default)s.")
+    parser.add_argument("-t", "--timeout", type=float, default=30, help="Seconds to wait for a batch to settle, default to %(default)s.")
+    parser.add_argument("--url", help="REST API to load, default to an in-process stand-in.")
+    parser.add_argument("-l", "--latency", type=float, default=0.05, help="Commit latency of the stand-in, default to %(default)s.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of submissions the stand-in refuses with 503.")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="Share of batches the stand-in commits INVALID.")
+    args = parser.parse_args()
+    logging.getLogger("src").setLevel(logging.ERROR)
+    logging.getLogger("bank_tp").setLevel(logging.ERROR)
+
+    url = args.url
+    if url is None:
+        from src.devnet import Devnet, serve
+        devnet = Devnet(args.latency, args.fail_rate, args.invalid_rate, seed=0)
+        server = serve(devnet)
+        url = f"http://127.0.0.1:{server.server_port}"
+    accounts = [f"load-{i}" for i in range(args.accounts)]
+    results, elapsed = run(url, args.users, args.duration, accounts, parse_mix(args.mix), args.timeout)
+    report(results, elapsed)
+    if args.url is None:
+        server.shutdown()
+        devnet.stop()
+        print(f"stand-in: {dict(devnet.stats)}")
+
+
+if __name__ == "__main__":
+    main()
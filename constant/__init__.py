@@ -1,6 +1,33 @@
 TXTIMEOUT = 5
 ADDRESS_PREFIX_LEN = 6
 ADDRESS_SUFFIX_LEN = 64
+MAX_BATCH_SIZE = 100
+MAX_IN_FLIGHT = 8
+BARRIER_TIMEOUT = 30
+SUBMIT_RETRIES = 5
+SUBMIT_BACKOFF = 0.2
+IDEMPOTENCY_CACHE_SIZE = 10000
+METRICS_INTERVAL = 15
+ADDRESS_CACHE_SIZE = 65536
+PROFILE_PATH = "sawlet.prof"
+SIGN_CHUNK = 256
+KEY_FILE = "keys/wallet.priv"
+CACHE_DB = "cache/accounts.db"
+SNAPSHOT_DIR = "snapshots"
+TOP_N = 10
+WRITE_BEHIND_SIZE = 256
+WRITE_BEHIND_DELAY = 1.0
+PAGE_LIMIT = 1000
+SYNC_CHUNK = 1000
+RECONCILE_WORKERS = 10
+READ_WORKERS = 10
+MAX_SHARDS = 256
+REST_API_URL = "http://127.0.0.1:8008"
+VALIDATOR_URL = "tcp://127.0.0.1:4004"
+HTTP_POOL_SIZE = 10
+HTTP_TIMEOUT = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.1
 
 
 class OutOfBalanceException(ValueError): pass
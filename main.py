@@ -1,12 +1,21 @@
 from src.cli import parser
+from src import metrics
 
 
 def main():
     args = parser.parse_args()
-    args.func(args)
+    if args.profile:
+        metrics.profiler.start(args.profile, args.profile_out)
+    try:
+        args.func(args)
+    finally:
+        metrics.profiler.stop()
+        if args.metrics:
+            metrics.REGISTRY.write(args.metrics)
     #w1 = Wallet("houlu")
     #w2 = Wallet("guaguade", init_balance=100)
     #w2.transfer(w1, 10)
 
-main()
+if __name__ == "__main__":
+    main()
 
@@ -0,0 +1,71 @@
+"""
+Address derivation for the bank family, shared by the client and the processor.
+
+Name to address goes through a bounded LRU cache. The reverse index maps addresses back
+to names as they are derived or seen in decoded state, so listings and event sync can
+name an address without fetching and decoding its state.
+
+A hot account can be split into shards, shard i living at the account's address with its
+last byte advanced by i. All shards of an account share the address without that byte,
+so they sort next to each other and a single prefix read returns all of them.
+"""
+from hashlib import sha512
+import collections
+import functools
+import threading
+
+import constant
+
+FAMILY_NAME = "bank"
+FAMILY_PREFIX = sha512(FAMILY_NAME.encode()).hexdigest()[:constant.ADDRESS_PREFIX_LEN]
+
+
+class ReverseIndex:
+    "Bounded address -> name map, dropping the least recently learned entries first."
+    def __init__(self, maxsize=constant.ADDRESS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.names = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def learn(self, address, name):
+        with self.lock:
+            self.names[address] = name
+            self.names.move_to_end(address)
+            if len(self.names) > self.maxsize:
+                self.names.popitem(last=False)
+
+    def get(self, address):
+        return self.names.get(address)
+
+
+names = ReverseIndex()
+
+
+@functools.lru_cache(maxsize=constant.ADDRESS_CACHE_SIZE)
+def get_address(name):
+    address = FAMILY_PREFIX + sha512(name.encode()).hexdigest()[:constant.ADDRESS_SUFFIX_LEN]
+    names.learn(address, name)
+    return address
+
+
+@functools.lru_cache(maxsize=constant.ADDRESS_CACHE_SIZE)
+def shard_addresses(name, shards):
+    "Return the addresses of the first @shards shards of @name; shard 0 is the account's own address."
+    if not 1 <= shards <= constant.MAX_SHARDS:
+        raise ValueError(f"Shard count must be between 1 and {constant.MAX_SHARDS}, got {shards}")
+    address = get_address(name)
+    stem, last = address[:-2], int(address[-2:], 16)
+    addresses = (address, *(f"{stem}{(last + i) % 256:02x}" for i in range(1, shards)))
+    for shard_address in addresses[1:]:
+        names.learn(shard_address, name)
+    return addresses
+
+
+def stem(address):
+    "Return @address without its shard byte, shared by every shard of one account."
+    return address[:-2]
+
+
+def resolve(address):
+    "Return the account name at @address if it has been derived or seen, else None."
+    return names.get(address)
@@ -0,0 +1,148 @@
+"""
+Bulk execution of newline-delimited operations through one shared `Operation`.
+
+Each line is either a JSON object naming the operation in "op" plus the CLI argument
+names, or a CSV row with the operation followed by the CLI positional arguments:
+
+    {"op": "deposit", "name": "alice", "amount": 10}
+    transfer,alice,bob,5
+    multi_transfer,alice,bob:1,carol:2
+
+Blank lines and lines starting with "#" are skipped.
+"""
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from collections import namedtuple
+import asyncio
+import csv
+import functools
+import itertools
+import json
+import time
+
+import constant
+from src.pipeline import Submitter
+
+# Operation's transfer methods only read the name of their wallet arguments
+Account = namedtuple("Account", ["name"])
+
+FIELDS = {
+    "create": ("name", "balance"),
+    "transfer": ("src", "dst", "amount"),
+    "multi_transfer": ("src", "legs"),
+    "deposit": ("name", "amount"),
+    "withdraw": ("name", "amount"),
+    "purge": ("name",),
+}
+
+
+def parse_leg(leg):
+    if isinstance(leg, str):
+        dst, _, amount = leg.rpartition(":")
+        return dst, int(amount)
+    dst, amount = leg
+    return dst, int(amount)
+
+
+def parse_line(line):
+    "Parse one JSON or CSV line into (op, {field: value}), raise ValueError if malformed."
+    if line.startswith("{"):
+        record = json.loads(line)
+        op = record.pop("op", None)
+        fields = record
+    else:
+        op, *values = next(csv.reader([line]))
+        names = FIELDS.get(op, ())
+        if op == "multi_transfer":
+            values = [values[0], values[1:]] if values else []
+        fields = dict(zip(names, values))
+    if op not in FIELDS:
+        raise ValueError(f"Unknown operation {op!r}")
+    missing = [name for name in FIELDS[op] if name not in fields and name != "balance"]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)} for {op}")
+    return op, fields
+
+
+def issue(oper, op, fields):
+    "Issue @op on @oper; inside a batcher this only queues the transaction."
+    if op == "create":
+        return oper.create_account(fields["name"], int(fields.get("balance", 0)))
+    elif op == "transfer":
+        return oper.transfer_money(Account(fields["src"]), Account(fields["dst"]), int(fields["amount"]))
+    elif op == "multi_transfer":
+        legs = [(Account(dst), amount) for dst, amount in map(parse_leg, fields["legs"])]
+        return oper.multi_transfer(Account(fields["src"]), legs)
+    elif op == "deposit":
+        return oper.deposit(fields["name"], int(fields["amount"]))
+    elif op == "withdraw":
+        return oper.withdraw(fields["name"], int(fields["amount"]))
+    elif op == "purge":
+        return oper.purge(fields["name"])
+
+
+def watch(futures, pending, report):
+    "Report the outcome of every (line number, op) of @pending once its future in @futures settles."
+    for (lineno, op), future in zip(pending, futures):
+        if future.done():  # Failed on submission
+            settled(report, lineno, op, future)
+        else:
+            future.add_done_callback(functools.partial(settled, report, lineno, op))
+
+
+def settled(report, lineno, op, future):
+    error = future.exception()
+    if error is None:
+        report(lineno, op, "COMMITTED", future.result())
+    else:
+        report(lineno, op, "INVALID" if isinstance(error, InvalidTransaction) else "FAILED", error)
+
+
+async def run(lines, oper, max_batch_size=constant.MAX_BATCH_SIZE, max_in_flight=constant.MAX_IN_FLIGHT, out=print, pool=None):
+    """
+    Stream @lines through @oper, submitting a batch every @max_batch_size operations.
+    One result per line is reported through @out as soon as its transaction settles, in
+    settling order, and a summary once every batch has settled.
+    Transactions are signed on the `SigningPool` @pool if given, once their batch can be
+    submitted. A line sharing a batch with, or depending on, an invalid line is resubmitted
+    without it and reported with its own outcome.
+    """
+    start = time.monotonic()
+    counts = {}
+
+    def report(lineno, op, status, detail):
+        counts[status] = counts.get(status, 0) + 1
+        out(f"{lineno}\t{op or '-'}\t{status}\t{detail}")
+
+    loop = asyncio.get_running_loop()
+    lines = iter(lines)
+    lineno = 0
+    pending = []  # (line number, op) queued on the builder
+    async with Submitter(oper, max_in_flight=max_in_flight) as submitter:
+        with oper.batch(max_batch_size, autoflush=False, pool=pool, defer=True) as builder:
+            while True:
+                # Read off the event loop, so results keep coming while a slow stream is waited on
+                chunk = await loop.run_in_executor(None, list, itertools.islice(lines, max_batch_size))
+                if not chunk:
+                    break
+                for line in chunk:
+                    lineno += 1
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    try:
+                        op, fields = parse_line(line)
+                        issue(oper, op, fields)
+                    except (ValueError, KeyError, TypeError) as e:
+                        report(lineno, None, "MALFORMED", e)
+                        continue
+                    pending.append((lineno, op))
+                    if len(builder.txns) >= max_batch_size:
+                        watch(await submitter.submit_builder(builder), pending, report)
+                        pending = []
+            watch(await submitter.submit_builder(builder), pending, report)
+
+    elapsed = time.monotonic() - start
+    summary = ", ".join(f"{count} {status.lower()}" for status, count in sorted(counts.items()))
+    out(f"{sum(counts.values())} operations in {elapsed:.2f}s ({summary or 'nothing to do'})")
+    return counts
@@ -1,59 +1,155 @@
 import argparse
-from src.wallet import Wallet, Admin
+
+import constant
+
+# The Sawtooth SDK, protobuf and requests are imported inside the subcommands that need
+# them, so `--help` and cache-only commands start without paying for those imports.
 
 def create(args):
+    from src.wallet import Wallet
     name = args.name
     balance = args.balance
-    new_wallet = Wallet(name=name)
+    new_wallet = Wallet(name=name, shards=args.shards)
     new_wallet.create(balance=balance, force=args.new)
 
 def transfer(args):
+    from src.wallet import Wallet
     src = args.src
     dst = args.dst
     amount = args.amount
-    src_wallet = Wallet(name=src)
+    src_wallet = Wallet(name=src, shards=args.shards)
     src_wallet.load(check=args.check)
-    dst_wallet = Wallet(name=dst)
+    dst_wallet = Wallet(name=dst, shards=args.shards)
     dst_wallet.load(check=args.check)
     src_wallet.transfer(dst_wallet, amount)
 
+def multi_transfer(args):
+    from src.wallet import Wallet
+    src_wallet = Wallet(name=args.src, shards=args.shards)
+    src_wallet.load(check=args.check)
+    legs = []
+    for dst, amount in args.legs:
+        dst_wallet = Wallet(name=dst, shards=args.shards)
+        dst_wallet.load(check=args.check)
+        legs.append((dst_wallet, amount))
+    src_wallet.multi_transfer(legs)
+
+def leg(value):
+    dst, sep, amount = value.rpartition(":")
+    if not sep or not dst:
+        raise argparse.ArgumentTypeError(f"Expected DST:AMOUNT, got {value!r}")
+    return dst, int(amount)
+
+def shard(value):
+    name, sep, shards = value.rpartition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"Expected NAME=SHARDS, got {value!r}")
+    return name, int(shards)
+
 def deposit(args):
+    from src.wallet import Wallet
     name = args.name
     amount = args.amount
-    wallet = Wallet(name=name)
+    wallet = Wallet(name=name, shards=args.shards)
     wallet.load(check=args.check)
     wallet.deposit(amount)
 
 def withdraw(args):
+    from src.wallet import Wallet
     name = args.name
     amount = args.amount
-    wallet = Wallet(name=name)
+    wallet = Wallet(name=name, shards=args.shards)
     wallet.load(check=args.check)
     wallet.withdraw(amount)
 
 def purge(args):
+    from src.wallet import Wallet
     name = args.name
-    wallet = Wallet(name=name)
+    wallet = Wallet(name=name, shards=args.shards)
     wallet.load(check=args.check)
     wallet.purge()
 
 def query(args):
     name = args.name
     key = args.key
-    wallet = Wallet(name=name)
+    if args.local:
+        from src.store import get_store
+        account = get_store().get(name)
+        print(f"Account {name} has {key} value of {account[key] if account else None}")
+        return
+    from src.wallet import Wallet
+    wallet = Wallet(name=name, shards=args.shards)
     value = wallet.query(key=key)
 
 def lst(args):
     check = args.check
-    print(check)
-    admin = Admin()
+    if args.local:
+        from src.store import get_store
+        for account in get_store():
+            print(f"Account name: {account['name']}, balance: ${account['balance']}")
+        return
+    from src.wallet import Admin
+    admin = Admin(shards=args.shards)
     admin.lst(check)
 
+def reconcile(args):
+    from src.wallet import Admin
+    stats = Admin(shards=args.shards).reconcile(workers=args.workers)
+    print(
+        f"Checked {stats['checked']} accounts in {stats['elapsed']:.2f}s "
+        f"({stats['checked'] / stats['elapsed'] if stats['elapsed'] else 0:.0f}/s): "
+        f"{stats['drifted']} drifted, total drift ${stats['total_drift']}, max drift ${stats['max_drift']}, "
+        f"{stats['missing']} missing on chain"
+    )
+
+def export(args):
+    try:
+        from src import snapshot
+    except ImportError as e:
+        raise SystemExit(f"export needs NumPy ({e}), install it with `pip install numpy`")
+    from src.wallet import Operation
+    oper = Operation()
+    if args.diff:
+        old, new = (snapshot.resolve(oper, source) for source in args.diff)
+        diff = old.diff(new, top=args.top)
+        print(f"From block {diff['from']} to {diff['to']}: {diff['created']} created, {diff['purged']} purged, "
+              f"{diff['changed']} changed, net ${diff['net']:+}")
+        for name, before, after in diff["top"]:
+            print(f"  {name}: {'-' if before is None else f'${before}'} -> {'-' if after is None else f'${after}'}")
+        return
+    snap = snapshot.Snapshot.take(oper, head=args.head)
+    path = snap.save(args.output or snapshot.default_path(snap.head))
+    stats = snap.stats(top=args.top)
+    print(f"Block {snap.head}: {stats['accounts']} accounts saved to {path}")
+    print(f"Total ${stats['total']}, mean ${stats['mean']:.2f}, min ${stats['min']}, max ${stats['max']}")
+    print("Percentiles: " + ", ".join(f"p{q} ${value:.0f}" for q, value in stats["percentiles"].items()))
+    for name, balance in stats["top"]:
+        print(f"  {name}: ${balance}")
+
+def batch(args):
+    import asyncio
+    import contextlib
+    import functools
+    from src.wallet import Operation
+    from src.signer import SigningPool
+    from src import bulk
+    oper = Operation(shards=args.shards)
+    with SigningPool(oper.signer, args.sign_workers) if args.sign_workers else contextlib.nullcontext() as pool:
+        asyncio.run(bulk.run(args.file, oper, args.batch_size, args.in_flight, out=functools.partial(print, flush=True), pool=pool))
+
+def sync(args):
+    from src.events import CacheSync
+    CacheSync(url=args.url).run()
 
 
 parser = argparse.ArgumentParser(description="A wallet by Hyperledger Sawtooth", prog="Sawlet")
 #parser.add_argument("name", type=str, help="Provide the account name.")
 parser.add_argument("-c", "--check", help="Check the balance while loading the account.", action="store_true")
+parser.add_argument("--shard", type=shard, action="append", dest="shards", default=[], metavar="NAME=SHARDS",
+                    help="Treat account NAME as a hot account split into SHARDS shards, repeat for more accounts.")
+parser.add_argument("--metrics", type=str, help="Write a metrics snapshot to this file when done, JSON if it ends in .json, Prometheus text otherwise.")
+parser.add_argument("--profile", type=int, help="Profile the first N transactions with cProfile.", default=0)
+parser.add_argument("--profile-out", type=str, help="cProfile output file, default to %(default)s.", default=constant.PROFILE_PATH)
 
 subparsers = parser.add_subparsers(help="All supported operations for the account.")
 
@@ -71,6 +167,12 @@ transfer_parser.add_argument("dst", type=str, help="Destination account name")
 transfer_parser.add_argument("amount", type=int, help="Amount of money")
 transfer_parser.set_defaults(func=transfer)
 
+multi_transfer_parser = subparsers.add_parser("multi_transfer", help="Transfer money from source to many destination accounts in one transaction.")
+
+multi_transfer_parser.add_argument("src", type=str, help="Source account name")
+multi_transfer_parser.add_argument("legs", type=leg, nargs="+", metavar="DST:AMOUNT", help="Destination account name and amount of money")
+multi_transfer_parser.set_defaults(func=multi_transfer)
+
 deposit_parser = subparsers.add_parser("deposit", help="Deposit money.")
 
 deposit_parser.add_argument("name", type=str, help="Name of the account.")
@@ -93,10 +195,35 @@ query_parser = subparsers.add_parser("query", help="Query account.")
 
 query_parser.add_argument("name", type=str, help="Name of the account.")
 query_parser.add_argument("-k", "--key", type=str, help="Which key to query.", default="balance")
+query_parser.add_argument("-l", "--local", action="store_true", help="Read from the local cache kept current by `sync`.")
 query_parser.set_defaults(func=query)
 
 list_parser = subparsers.add_parser("list", help="List all accounts.")
 list_parser.add_argument("-c", "--check", help="Synchronize with blockchain.", action="store_true")
+list_parser.add_argument("-l", "--local", action="store_true", help="List the local cache without contacting the blockchain.")
 list_parser.set_defaults(func=lst)
 
+reconcile_parser = subparsers.add_parser("reconcile", help="Check cached balances against blockchain and fix the ones that drifted.")
+reconcile_parser.add_argument("-j", "--workers", type=int, help="Concurrent state reads, default to %(default)s.", default=constant.RECONCILE_WORKERS)
+reconcile_parser.set_defaults(func=reconcile)
+
+export_parser = subparsers.add_parser("export", help="Save a columnar snapshot of all accounts and report totals, percentiles and top balances.")
+export_parser.add_argument("-o", "--output", type=str, help="Snapshot directory, default to %s/<block>." % constant.SNAPSHOT_DIR)
+export_parser.add_argument("--head", type=str, help="Block to read at, default to the chain head.")
+export_parser.add_argument("-n", "--top", type=int, help="Number of top balances or moves to show, default to %(default)s.", default=constant.TOP_N)
+export_parser.add_argument("-d", "--diff", nargs=2, metavar=("OLD", "NEW"),
+                           help="Compare two snapshots instead, each a snapshot directory or a block to read at.")
+export_parser.set_defaults(func=export)
+
+batch_parser = subparsers.add_parser("batch", help="Execute operations from a file or stdin, one JSON object or CSV row per line.")
+batch_parser.add_argument("file", nargs="?", type=argparse.FileType("r"), help="File of operations, default to stdin.", default="-")
+batch_parser.add_argument("-s", "--batch-size", type=int, help="Operations per batch, default to %(default)s.", default=constant.MAX_BATCH_SIZE)
+batch_parser.add_argument("-j", "--in-flight", type=int, help="Batches in flight, default to %(default)s.", default=constant.MAX_IN_FLIGHT)
+batch_parser.add_argument("-p", "--sign-workers", type=int, help="Sign on this many worker processes, default to signing in-process.", default=0)
+batch_parser.set_defaults(func=batch)
+
+sync_parser = subparsers.add_parser("sync", help="Keep the local cache synchronized with blockchain events.")
+sync_parser.add_argument("-u", "--url", type=str, help="Validator URL, default to %(default)s.", default=constant.VALIDATOR_URL)
+sync_parser.set_defaults(func=sync)
+
 
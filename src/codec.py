@@ -0,0 +1,125 @@
+"""
+Encodings of payloads and account state for each family version.
+
+1.1 uses JSON for both. 1.2 uses a compact binary layout:
+
+    payload: op code (u8) followed by the op's fields in a fixed order
+    state:   format version (u8), balance (i64), name length (u16), name (utf-8)
+
+Strings are length-prefixed (u16) utf-8, integers are little-endian i64 and lists of
+(name, amount) legs are a u16 count followed by that many string/integer pairs.
+JSON state always starts with "{", so binary and JSON state can be told apart by the
+first byte and accounts written by 1.1 stay readable.
+"""
+import json
+import struct
+
+STATE_FORMAT = 1
+
+_u8 = struct.Struct("<B")
+_u16 = struct.Struct("<H")
+_i64 = struct.Struct("<q")
+_state_head = struct.Struct("<BqH")
+
+STR = "str"
+INT = "int"
+LEGS = "legs"
+
+# typ: (op code, ((field, kind), ...))
+PAYLOAD_FIELDS = {
+    "create": (1, (("name", STR), ("balance", INT))),
+    "transfer": (2, (("sender", STR), ("receiver", STR), ("amount", INT))),
+    "change": (3, (("name", STR), ("amount", INT))),
+    "query": (4, (("name", STR), ("key", STR))),
+    "purge": (5, (("name", STR),)),
+    "multi_transfer": (6, (("sender", STR), ("receivers", LEGS))),
+    "sharded_change": (7, (("name", STR), ("amount", INT), ("shard", INT), ("shards", INT))),
+    "sharded_transfer": (8, (("sender", STR), ("shards", INT), ("receiver", STR), ("shard", INT), ("amount", INT))),
+    "sharded_query": (9, (("name", STR), ("key", STR), ("shards", INT))),
+    "sharded_purge": (10, (("name", STR), ("shards", INT))),
+}
+PAYLOAD_CODES = {code: (typ, fields) for typ, (code, fields) in PAYLOAD_FIELDS.items()}
+
+
+def _pack_str(value):
+    raw = value.encode()
+    return _u16.pack(len(raw)) + raw
+
+
+def _unpack_str(data, offset):
+    (length,) = _u16.unpack_from(data, offset)
+    offset += _u16.size
+    end = offset + length
+    if end > len(data):
+        raise ValueError("Truncated string field")
+    return data[offset:end].decode(), end
+
+
+def _unpack_int(data, offset):
+    return _i64.unpack_from(data, offset)[0], offset + _i64.size
+
+
+def _pack_legs(legs):
+    return _u16.pack(len(legs)) + b"".join(_pack_str(name) + _i64.pack(amount) for name, amount in legs)
+
+
+def _unpack_legs(data, offset):
+    (count,) = _u16.unpack_from(data, offset)
+    offset += _u16.size
+    legs = []
+    for _ in range(count):
+        name, offset = _unpack_str(data, offset)
+        amount, offset = _unpack_int(data, offset)
+        legs.append([name, amount])
+    return legs, offset
+
+
+_PACKERS = {STR: _pack_str, INT: _i64.pack, LEGS: _pack_legs}
+_UNPACKERS = {STR: _unpack_str, INT: _unpack_int, LEGS: _unpack_legs}
+
+
+def encode_payload(op_dic, version):
+    "Serialize operation dict @op_dic for family @version."
+    if version == "1.1":
+        return json.dumps(op_dic).encode()
+    code, fields = PAYLOAD_FIELDS[op_dic["typ"]]
+    return _u8.pack(code) + b"".join(_PACKERS[kind](op_dic[key]) for key, kind in fields)
+
+
+def decode_payload(data, version):
+    "Inverse of `encode_payload`, raise ValueError on malformed input."
+    if version == "1.1":
+        return json.loads(data.decode())
+    try:
+        typ, fields = PAYLOAD_CODES[data[0]]
+        payload = {"typ": typ}
+        offset = 1
+        for key, kind in fields:
+            payload[key], offset = _UNPACKERS[kind](data, offset)
+    except (IndexError, KeyError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed payload: {e!r}")
+    if offset != len(data):
+        raise ValueError("Trailing bytes in payload")
+    return payload
+
+
+def encode_account(account, version):
+    "Serialize account dict {name: , balance: } for family @version."
+    if version == "1.1":
+        return json.dumps(account).encode()
+    name = account["name"].encode()
+    return _state_head.pack(STATE_FORMAT, account["balance"], len(name)) + name
+
+
+def decode_account(data):
+    "Decode account state written by any family version."
+    if data[:1] == b"{":
+        return json.loads(data)
+    fmt, balance, length = _state_head.unpack_from(data)
+    if fmt != STATE_FORMAT:
+        raise ValueError(f"Unknown account state format {fmt}")
+    offset = _state_head.size
+    return {
+        "name": data[offset:offset + length].decode(),
+        "balance": balance,
+    }
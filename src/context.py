@@ -0,0 +1,71 @@
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from collections import namedtuple
+
+from src import metrics
+
+StateEntry = namedtuple("StateEntry", ["address", "data"])
+
+
+class MemoryContext:
+    """
+    In-process stand-in for `sawtooth_sdk.processor.context.Context` backed by a dict,
+    so a handler's apply() can run without a validator.
+    Like the real context, get_state only returns addresses that hold data.
+    """
+    def __init__(self, state=None):
+        self.state = {} if state is None else state
+        self.receipts = []
+        self.events = []
+
+    def get_state(self, addresses, timeout=None):
+        return [StateEntry(address, self.state[address]) for address in addresses if self.state.get(address)]
+
+    def set_state(self, entries, timeout=None):
+        self.state.update(entries)
+        return list(entries)
+
+    def delete_state(self, addresses, timeout=None):
+        return [address for address in addresses if self.state.pop(address, None) is not None]
+
+    def add_receipt_data(self, data, timeout=None):
+        self.receipts.append(data)
+
+    def add_event(self, event_type, attributes=None, data=None, timeout=None):
+        self.events.append((event_type, attributes, data))
+
+
+GET_STATE_SECONDS = metrics.histogram("tp_get_state_seconds", "Time of one get_state call.")
+SET_STATE_SECONDS = metrics.histogram("tp_set_state_seconds", "Time of one set_state call.")
+DELETE_STATE_SECONDS = metrics.histogram("tp_delete_state_seconds", "Time of one delete_state call.")
+
+
+class TimedContext:
+    "Wrap a context so every state access is observed in the metrics registry."
+    def __init__(self, context):
+        self.context = context
+
+    def get_state(self, addresses, timeout=None):
+        with GET_STATE_SECONDS.time():
+            return self.context.get_state(addresses, timeout)
+
+    def set_state(self, entries, timeout=None):
+        with SET_STATE_SECONDS.time():
+            return self.context.set_state(entries, timeout)
+
+    def delete_state(self, addresses, timeout=None):
+        with DELETE_STATE_SECONDS.time():
+            return self.context.delete_state(addresses, timeout)
+
+    def add_receipt_data(self, data, timeout=None):
+        return self.context.add_receipt_data(data, timeout)
+
+    def add_event(self, event_type, attributes=None, data=None, timeout=None):
+        return self.context.add_event(event_type, attributes, data, timeout)
+
+
+def make_request(payload, version, family_name="bank", context_id=""):
+    "Wrap @payload into the `TpProcessRequest` a validator would hand to apply()."
+    header = TransactionHeader(family_name=family_name, family_version=version)
+    return TpProcessRequest(header=header, payload=payload, context_id=context_id)
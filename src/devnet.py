@@ -0,0 +1,374 @@
+"""
+Local stand-in for a Sawtooth REST API and validator, for exercising the client without a network.
+
+Serves the `/batches`, `/batch_statuses`, `/state` and `/receipts` endpoints `Operation` uses.
+Batches are applied by `TransferTransactionHandler` in-process, each one atomically, and are
+committed into a new block @latency seconds after they are accepted. Failures can be injected:
+a share of submissions is refused with 503 and a share of accepted batches is committed INVALID.
+
+Usage: python -m src.devnet [-p PORT] [-l LATENCY] [--fail-rate P] [--invalid-rate P]
+"""
+from sawtooth_sdk.protobuf.batch_pb2 import BatchHeader, BatchList
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hashlib import sha512
+import argparse
+import base64
+import collections
+import json
+import logging
+import random
+import threading
+import time
+import urllib.parse
+
+from bank_tp import TransferTransactionHandler
+from src.addressing import FAMILY_NAME
+from src.context import MemoryContext
+
+import constant
+
+logger = logging.getLogger(__name__)
+
+GENESIS_BLOCK_ID = "0" * 128
+
+
+class BatchContext(MemoryContext):
+    """
+    `MemoryContext` writing into an overlay of @state, so a batch only lands once all of
+    its transactions applied. Deleted addresses are kept in the overlay as None.
+    """
+    def __init__(self, state):
+        super().__init__(collections.ChainMap({}, state))
+
+    def delete_state(self, addresses, timeout=None):
+        deleted = [address for address in addresses if self.state.get(address)]
+        for address in deleted:
+            self.state[address] = None
+        return deleted
+
+    @property
+    def changes(self):
+        "{address: new data, or None if deleted}"
+        return self.state.maps[0]
+
+
+class Devnet:
+    """
+    Chain state, blocks and batch statuses behind the HTTP front end.
+    A committer thread turns accepted batches into blocks once they are @latency seconds old;
+    @max_pending bounds the batches waiting for it, further submissions get 429 like a full validator queue.
+    Only `InvalidTransaction` makes a batch INVALID; any other handler exception is logged as
+    a processor crash and its batch stays PENDING, as it would on a validator.
+    """
+    def __init__(self, latency=0.0, fail_rate=0.0, invalid_rate=0.0, max_pending=0, seed=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.invalid_rate = invalid_rate
+        self.max_pending = max_pending
+        self.rng = random.Random(seed)
+        self.handler = TransferTransactionHandler()
+        self.state = {}
+        self.blocks = [(GENESIS_BLOCK_ID, {})]  # (block ID, {address: data before the block or None})
+        self.snapshots = collections.OrderedDict()  # block ID -> state at that block
+        self.statuses = {}  # batch ID -> status item
+        self.receipts = {}  # transaction ID -> receipt
+        self.committed = set()  # transaction IDs
+        self.pending = collections.deque()  # (due time, batch, forced invalid)
+        self.stats = collections.Counter()
+        self.cond = threading.Condition()
+        self.running = False
+
+    @property
+    def head(self):
+        return self.blocks[-1][0]
+
+    def start(self):
+        self.running = True
+        self.committer = threading.Thread(target=self.run, name="devnet-committer", daemon=True)
+        self.committer.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.committer.join()
+
+    def submit(self, batch_list_bytes):
+        """
+        Accept the batches of a serialized BatchList.
+        Return:
+            %code: HTTP status, 202 once accepted
+        """
+        batches = BatchList.FromString(batch_list_bytes).batches
+        with self.cond:
+            if self.rng.random() < self.fail_rate:
+                self.stats["refused"] += 1
+                return 503
+            if self.max_pending and len(self.pending) + len(batches) > self.max_pending:
+                self.stats["queue_full"] += 1
+                return 429
+            due = time.monotonic() + self.latency
+            for batch in batches:
+                if batch.header_signature in self.statuses:  # Resubmitted, already known
+                    continue
+                self.statuses[batch.header_signature] = {
+                    "id": batch.header_signature,
+                    "status": "PENDING",
+                    "invalid_transactions": [],
+                }
+                self.pending.append((due, batch, self.rng.random() < self.invalid_rate))
+            self.stats["batches"] += len(batches)
+            self.cond.notify_all()
+        return 202
+
+    def run(self):
+        "Commit every batch that is due into one block, until stopped."
+        with self.cond:
+            while self.running:
+                if not self.pending:
+                    self.cond.wait()
+                    continue
+                delay = self.pending[0][0] - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                undo = {}
+                block_batches = []
+                while self.pending and self.pending[0][0] <= time.monotonic():
+                    _, batch, invalid = self.pending.popleft()
+                    self.apply_batch(batch, invalid, undo)
+                    block_batches.append(batch.header_signature)
+                block_id = sha512("".join([self.head, *block_batches]).encode()).hexdigest()
+                self.blocks.append((block_id, undo))
+                self.cond.notify_all()
+
+    def apply_batch(self, batch, invalid, undo):
+        "Apply the transactions of @batch in order and land their writes only if all of them are valid."
+        status = self.statuses[batch.header_signature]
+        context = BatchContext(self.state)
+        txids = set(BatchHeader.FromString(batch.header).transaction_ids)
+        receipts = {}
+        txn = batch.transactions[0]
+        try:
+            if invalid:
+                raise InvalidTransaction("Injected failure")
+            for txn in batch.transactions:
+                header = TransactionHeader.FromString(txn.header)
+                if txn.header_signature in self.committed:
+                    raise InvalidTransaction(f"Transaction {txn.header_signature} is already committed")
+                if txn.header_signature in receipts:
+                    raise InvalidTransaction(f"Transaction {txn.header_signature} appears twice in batch")
+                if header.family_name != FAMILY_NAME:
+                    raise InvalidTransaction(f"No handler for family {header.family_name}")
+                for dependency in header.dependencies:
+                    if dependency not in self.committed and dependency not in txids:
+                        raise InvalidTransaction(f"Dependency {dependency} is not committed")
+                before = dict(context.changes)
+                context.receipts = []
+                request = TpProcessRequest(header=header, payload=txn.payload, signature=txn.header_signature)
+                self.handler.apply(request, context)
+                receipts[txn.header_signature] = {
+                    "transaction_id": txn.header_signature,
+                    "state_changes": [
+                        {"address": address, "type": "DELETE" if data is None else "SET",
+                         "value": base64.b64encode(data or b"").decode()}
+                        for address, data in context.changes.items() if before.get(address, ...) != data
+                    ],
+                    "events": [],
+                    "data": [base64.b64encode(data).decode() for data in context.receipts],
+                }
+        except InvalidTransaction as e:
+            status["status"] = "INVALID"
+            status["invalid_transactions"] = [{"id": txn.header_signature, "message": str(e)}]
+            self.stats["invalid"] += 1
+            return
+        except Exception:  # A real processor would die here and the validator keep the batch pending
+            logger.exception(f"Transaction {txn.header_signature} crashed the handler, batch {batch.header_signature} stays PENDING")
+            self.stats["crashed"] += 1
+            return
+        for address, data in context.changes.items():
+            undo.setdefault(address, self.state.get(address))
+            if data is None:
+                self.state.pop(address, None)
+            else:
+                self.state[address] = data
+        self.committed.update(receipts)
+        self.receipts.update(receipts)
+        status["status"] = "COMMITTED"
+        self.stats["committed"] += 1
+
+    def get_statuses(self, batch_ids, wait=0):
+        "Status items of @batch_ids, waiting up to @wait seconds for the pending ones to settle."
+        deadline = time.monotonic() + wait
+        unknown = {"status": "UNKNOWN", "invalid_transactions": []}
+        with self.cond:
+            while True:
+                items = [self.statuses.get(batch_id, dict(unknown, id=batch_id)) for batch_id in batch_ids]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or all(item["status"] != "PENDING" for item in items):
+                    return [dict(item) for item in items]
+                self.cond.wait(remaining)
+
+    def state_at(self, head=None):
+        "Return the state at block @head, the current one if None; KeyError for an unknown block."
+        if head is None or head == self.head:
+            return self.state
+        if head not in self.snapshots:
+            index = next((i for i, (block_id, _) in enumerate(self.blocks) if block_id == head), None)
+            if index is None:
+                raise KeyError(head)
+            state = dict(self.state)
+            for _, undo in reversed(self.blocks[index + 1:]):
+                for address, data in undo.items():
+                    if data is None:
+                        state.pop(address, None)
+                    else:
+                        state[address] = data
+            self.snapshots[head] = state
+            if len(self.snapshots) > 4:
+                self.snapshots.popitem(last=False)
+        return self.snapshots[head]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    "Route the REST API endpoints to `self.server.devnet`."
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the pooled client session expects
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, body, code=200):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, code, title):
+        self.send_json({"error": {"code": code, "title": title}}, code)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        path = url.path.rstrip("/")
+        if path == "/batch_statuses":
+            return self.batch_statuses(query.get("id", "").split(","), query)
+        if path == "/state":
+            return self.list_state(query)
+        if path.startswith("/state/"):
+            return self.get_state(path[len("/state/"):], query)
+        if path == "/receipts":
+            return self.get_receipts(query.get("id", "").split(","))
+        self.send_error_json(404, "Not Found")
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        path = url.path.rstrip("/")
+        body = self.read_body()
+        if path == "/batches":
+            code = self.server.devnet.submit(body)
+            if code != 202:
+                return self.send_error_json(code, "Service Unavailable" if code == 503 else "Too Many Requests")
+            batch_ids = ",".join(batch.header_signature for batch in BatchList.FromString(body).batches)
+            return self.send_json({"link": f"http://{self.headers['Host']}/batch_statuses?id={batch_ids}"}, 202)
+        if path == "/batch_statuses":
+            return self.batch_statuses(json.loads(body), query)
+        self.send_error_json(404, "Not Found")
+
+    def batch_statuses(self, batch_ids, query):
+        wait = float(query.get("wait") or 0)
+        self.send_json({"data": self.server.devnet.get_statuses(batch_ids, wait)})
+
+    def get_state(self, address, query):
+        devnet = self.server.devnet
+        with devnet.cond:
+            try:
+                data = devnet.state_at(query.get("head")).get(address)
+            except KeyError:
+                return self.send_error_json(404, "Block Not Found")
+            head = query.get("head") or devnet.head
+        if data is None:
+            return self.send_error_json(404, "State Not Found")
+        self.send_json({"data": base64.b64encode(data).decode(), "head": head})
+
+    def list_state(self, query):
+        devnet = self.server.devnet
+        prefix = query.get("address", "")
+        limit = int(query.get("limit", constant.PAGE_LIMIT))
+        start = query.get("start", "")
+        with devnet.cond:
+            try:
+                state = devnet.state_at(query.get("head"))
+            except KeyError:
+                return self.send_error_json(404, "Block Not Found")
+            head = query.get("head") or devnet.head
+            addresses = sorted(address for address in state if address.startswith(prefix) and address >= start)
+            page = [{"address": address, "data": base64.b64encode(state[address]).decode()} for address in addresses[:limit]]
+        paging = {"start": start, "limit": limit}
+        if len(addresses) > limit:
+            paging["next_position"] = addresses[limit]
+        self.send_json({"data": page, "head": head, "paging": paging})
+
+    def get_receipts(self, txids):
+        receipts = self.server.devnet.receipts
+        found = [receipts[txid] for txid in txids if txid in receipts]
+        if not found:
+            return self.send_error_json(404, "Receipt Not Found")
+        self.send_json({"data": found})
+
+
+def serve(devnet, host="127.0.0.1", port=0):
+    """
+    Start @devnet and an HTTP server for it on a background thread.
+    Return:
+        %server: the running server, its URL is `f"http://{host}:{server.server_port}"`
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.devnet = devnet
+    devnet.start()
+    threading.Thread(target=server.serve_forever, name="devnet-http", daemon=True).start()
+    return server
+
+
+def main():
+    default = urllib.parse.urlsplit(constant.REST_API_URL)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-H", "--host", default=default.hostname, help="Interface to listen on, default to %(default)s.")
+    parser.add_argument("-p", "--port", type=int, default=default.port, help="Port to listen on, default to %(default)s.")
+    parser.add_argument("-l", "--latency", type=float, default=0.0, help="Seconds from accepting a batch to committing it, default to %(default)s.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of POST /batches refused with 503.")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="Share of accepted batches committed INVALID.")
+    parser.add_argument("--max-pending", type=int, default=0, help="Pending batches before POST /batches gets 429, 0 for no limit.")
+    parser.add_argument("--seed", type=int, help="Seed of the failure injection.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    logging.getLogger("bank_tp").setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
+    devnet = Devnet(args.latency, args.fail_rate, args.invalid_rate, args.max_pending, args.seed)
+    server = serve(devnet, args.host, args.port)
+    logger.info(f"Serving the REST API on http://{args.host}:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        devnet.stop()
+        logger.info(f"Stopped: {dict(devnet.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,128 @@
 from sawtooth_sdk.protobuf.client_event_pb2 import ClientEventsSubscribeRequest, ClientEventsSubscribeResponse
-from sawtooth_sdk.protobuf.events_pb2 import EventSubscription, EventFilter, EventList, Event
+from sawtooth_sdk.protobuf.events_pb2 import EventSubscription, EventFilter, EventList
+from sawtooth_sdk.protobuf.transaction_receipt_pb2 import StateChangeList, StateChange
 from sawtooth_sdk.protobuf.validator_pb2 import Message
 
+import logging
+import uuid
+
 import zmq
-import time
-
-
-def subscribe():
-    subscription = EventSubscription(
-        event_type="sawtooth/state-delta",
-        filters=[
-            EventFilter(
-                key="address",
-                match_string="3a8434.*",
-                filter_type=EventFilter.REGEX_ANY,
-            )
-        ],
-    )
-    
-    url = "tcp://127.0.0.1:4004"
-    ctx = zmq.Context()
-    socket = ctx.socket(zmq.DEALER)
-    socket.connect(url)
-    
-    request = ClientEventsSubscribeRequest(
-        subscriptions=[subscription]).SerializeToString()
-
-    correlation_id = "123"
-    msg = Message(
-        correlation_id=correlation_id,
-        message_type=Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST,
-        content=request,
-    ).SerializeToString()
-    socket.send_multipart([msg])
-
-    time.sleep(2)
-    resp = socket.recv_multipart()[-1]
-    msg = Message()
-    msg.ParseFromString(resp)
-    if msg.message_type != Message.CLIENT_EVENTS_SUBSCRIBE_RESPONSE:
-        print(f"Unexpected message type: {msg.message_type}")
-        return
-
-    response = ClientEventsSubscribeResponse()
-    response.ParseFromString(msg.content)
-
-    if response.status != ClientEventsSubscribeResponse.OK:
-        print(f"Subscription failed, status code is {response.status}")
-        return
-
-    while True:
-        resp = socket.recv_multipart()[-1]
-        msg = Message()
-        msg.ParseFromString(resp)
-        if msg.message_type != Message.CLIENT_EVENTS:
-            print(f"Unexpected message type: {msg.message_type}")
 
-        events = EventList()
-        events.ParseFromString(msg.content)
-        print(events)
+import constant
+from src import codec
+from src.store import get_store
+from src import addressing
+
+logger = logging.getLogger(__name__)
+
+LAST_BLOCK_KEY = "last_block_id"
+
+
+class CacheSync:
+    """
+    Long-running daemon keeping the local account store in step with the chain.
+
+    Subscribes to block-commit and state-delta events of the bank namespace, applies
+    every block's state changes to the store together with the block id, and resumes
+    from that block id via `last_known_block_ids` after a restart.
+    """
+    def __init__(self, url=constant.VALIDATOR_URL, store=None):
+        self.url = url
+        self.store = store or get_store()
+        self.family_prefix = addressing.FAMILY_PREFIX
+        self.socket = None
+
+    def subscriptions(self):
+        return [
+            EventSubscription(event_type="sawtooth/block-commit"),
+            EventSubscription(
+                event_type="sawtooth/state-delta",
+                filters=[
+                    EventFilter(
+                        key="address",
+                        match_string=f"{self.family_prefix}.*",
+                        filter_type=EventFilter.REGEX_ANY,
+                    )
+                ],
+            ),
+        ]
+
+    def request(self, message_type, content):
+        msg = Message(
+            correlation_id=uuid.uuid4().hex,
+            message_type=message_type,
+            content=content,
+        ).SerializeToString()
+        self.socket.send_multipart([msg])
+        return self.receive()
+
+    def receive(self):
+        msg = Message()
+        msg.ParseFromString(self.socket.recv_multipart()[-1])
+        return msg
 
-        #@for event in events:
-        #@    print(event)
+    def subscribe(self):
+        ctx = zmq.Context.instance()
+        self.socket = ctx.socket(zmq.DEALER)
+        self.socket.connect(self.url)
+        last_block_id = self.store.get_meta(LAST_BLOCK_KEY)
+        known = [last_block_id] if last_block_id else []
+        while True:
+            request = ClientEventsSubscribeRequest(
+                subscriptions=self.subscriptions(),
+                last_known_block_ids=known,
+            ).SerializeToString()
+            msg = self.request(Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST, request)
+            if msg.message_type != Message.CLIENT_EVENTS_SUBSCRIBE_RESPONSE:
+                raise RuntimeError(f"Unexpected message type: {msg.message_type}")
+            response = ClientEventsSubscribeResponse()
+            response.ParseFromString(msg.content)
+            if response.status == ClientEventsSubscribeResponse.UNKNOWN_BLOCK and known:
+                logger.warning(f"Block {last_block_id} is unknown to the validator, subscribing from the chain head. Run `list -c` for a full resync.")
+                known = []
+                continue
+            if response.status != ClientEventsSubscribeResponse.OK:
+                raise RuntimeError(f"Subscription failed, status code is {response.status}")
+            logger.info(f"Subscribed to {self.url}, resuming after block {last_block_id}")
+            return
 
-        
+    def apply(self, events):
+        "Apply one block's EventList to the store, return the block id."
+        block_id = None
+        rows = []
+        deleted = []
+        for event in events.events:
+            if event.event_type == "sawtooth/block-commit":
+                block_id = next(attr.value for attr in event.attributes if attr.key == "block_id")
+            elif event.event_type == "sawtooth/state-delta":
+                changes = StateChangeList()
+                changes.ParseFromString(event.data)
+                for change in changes.state_changes:
+                    if not change.address.startswith(self.family_prefix):
+                        continue
+                    if change.type == StateChange.SET:
+                        value = codec.decode_account(change.value)
+                        addressing.names.learn(change.address, value["name"])
+                        rows.append((value["name"], change.address, value["balance"]))
+                    elif change.type == StateChange.DELETE:
+                        deleted.append(change.address)
+                        logger.debug(f"Account {addressing.resolve(change.address) or change.address} purged")
+        meta = {LAST_BLOCK_KEY: block_id} if block_id else None
+        self.store.apply_states(rows, deleted, meta)
+        logger.info(f"Block {block_id}: {len(rows)} accounts updated, {len(deleted)} purged")
+        return block_id
 
-subscribe()
+    def run(self):
+        self.subscribe()
+        while True:
+            msg = self.receive()
+            if msg.message_type != Message.CLIENT_EVENTS:
+                logger.warning(f"Unexpected message type: {msg.message_type}")
+                continue
+            events = EventList()
+            events.ParseFromString(msg.content)
+            self.apply(events)
 
 
+if __name__ == "__main__":
+    CacheSync().run()
@@ -0,0 +1,212 @@
+"""
+Lightweight in-process metrics: counters and fixed-bucket histograms, exported as a
+Prometheus text file or a JSON snapshot, plus a cProfile hook covering N transactions.
+
+Hot paths resolve their metric once and then only pay for a clock read, a bisect and
+two additions per observation, made under a per-metric lock since submitter executors,
+load generator users and reconcile workers update the same metrics concurrently:
+
+    SIGN_SECONDS = metrics.histogram("client_sign_seconds", "Time to sign a transaction header.")
+    with SIGN_SECONDS.time():
+        ...
+"""
+import bisect
+import cProfile
+import json
+import os
+import pathlib
+import threading
+import time
+
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class FunctionCounter:
+    "Counter whose value is kept elsewhere and read from @func when exported."
+    kind = "counter"
+
+    def __init__(self, func):
+        self.func = func
+
+    @property
+    def value(self):
+        return self.func()
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        "Context manager observing the time spent in its block, in seconds."
+        return _Timer(self)
+
+    def snapshot(self):
+        "Return the count, sum and cumulative buckets, read together so they agree."
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip([*map(str, self.buckets), "+Inf"], counts):
+            cumulative += bucket_count
+            buckets[bound] = cumulative
+        return {"count": count, "sum": total, "buckets": buckets}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}  # (name, labels) -> metric
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, cls())
+                self.help.setdefault(name, help)
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help="", **labels):
+        return self._get(Histogram, name, help, labels)
+
+    def counter_func(self, name, func, help="", **labels):
+        "Register a `FunctionCounter` reading @func, replacing any metric of that name and labels."
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            metric = self.metrics[key] = FunctionCounter(func)
+            self.help.setdefault(name, help)
+        return metric
+
+    def to_json(self):
+        snapshot = {}
+        for (name, labels), metric in list(self.metrics.items()):
+            snapshot.setdefault(name, []).append({"labels": dict(labels), **metric.snapshot()})
+        return json.dumps(snapshot, indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        described = set()
+        for (name, labels), metric in sorted(self.metrics.items(), key=lambda item: item[0]):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            pairs = [f'{key}="{value}"' for key, value in labels]
+            label_str = f"{{{','.join(pairs)}}}" if pairs else ""
+            if metric.kind == "counter":
+                lines.append(f"{name}{label_str} {metric.value}")
+                continue
+            snapshot = metric.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                bucket_labels = ",".join([*pairs, f'le="{bound}"'])
+                lines.append(f"{name}_bucket{{{bucket_labels}}} {count}")
+            lines.append(f"{name}_sum{label_str} {snapshot['sum']}")
+            lines.append(f"{name}_count{label_str} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        "Write a JSON snapshot if @path ends in .json, Prometheus text otherwise, atomically."
+        path = pathlib.Path(path)
+        content = self.to_json() if path.suffix == ".json" else self.to_prometheus()
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(content)
+        os.replace(tmp_path, path)
+
+    def export_every(self, path, interval):
+        "Rewrite @path every @interval seconds from a daemon thread, e.g. for a Prometheus textfile collector."
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.write(path)
+        thread = threading.Thread(target=loop, name="metrics-exporter", daemon=True)
+        thread.start()
+        return thread
+
+
+class TransactionProfiler:
+    "cProfile hook that, once started, covers the next @n transactions and dumps its stats."
+    def __init__(self):
+        self.remaining = 0
+        self.profile = None
+        self.path = None
+
+    def start(self, n, path):
+        self.remaining = n
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def tick(self):
+        "Mark one transaction done; hot paths call this unconditionally, so it must stay trivial."
+        if self.remaining:
+            self.remaining -= 1
+            if not self.remaining:
+                self.stop()
+
+    def stop(self):
+        if self.profile is None:
+            return
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        self.profile = None
+        self.remaining = 0
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+counter_func = REGISTRY.counter_func
+profiler = TransactionProfiler()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+import constant
+
+logger = logging.getLogger(__name__)
+
+
+class Submitter:
+    """
+    Asynchronous submission engine for an `Operation`.
+
+    Keeps at most @max_in_flight batches in flight. A single poller asks `/batch_statuses`
+    for every in-flight batch in one request and resolves one future per transaction:
+    with the transaction ID once COMMITTED, or with `InvalidTransaction` once INVALID.
+
+    A batch is atomic, so one invalid transaction would sink its batch-mates, and with them
+    every transaction depending on them. Only the transactions a validator names as invalid
+    fail; the others are signed again without them and resubmitted one per batch, their
+    futures resolving with the new transaction IDs.
+    """
+    def __init__(self, oper, max_in_flight=constant.MAX_IN_FLIGHT, poll_interval=0.2, timeout=60):
+        self.oper = oper
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.in_flight = {}  # batch_id -> (submit time, {txid: future}, whether it holds a slot)
+        self.txns = {}  # ID of an in-flight transaction -> (transaction, batch ID)
+        self.dependents = {}  # ID of an in-flight transaction -> IDs of in-flight transactions depending on it
+        self._slots = None
+        self._poller = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.join()
+
+    async def submit(self, *txns, pool=None):
+        """
+        Sign @txns into one batch and submit it, waiting for a free slot first. `Unsigned`
+        operations among @txns are signed (on @pool if given) once the slot is free.
+        Return:
+            %futures: one future per transaction, in order
+        """
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        await self._slots.acquire()
+        txns = self.oper.sign_transactions(list(txns), pool)
+        batch_id, batch = self.oper.generate_batch(*txns)
+        futures = {txn.header_signature: loop.create_future() for txn in txns}
+        self._register(batch_id, batch, futures, True)
+        await self._post([batch_id], BatchList(batches=[batch]).SerializeToString())
+        return list(futures.values())
+
+    async def submit_many(self, txns, max_batch_size=constant.MAX_BATCH_SIZE, pool=None):
+        "Split @txns into batches of at most @max_batch_size and submit them, return all futures."
+        futures = []
+        for start in range(0, len(txns), max_batch_size):
+            futures.extend(await self.submit(*txns[start:start + max_batch_size], pool=pool))
+        return futures
+
+    async def submit_builder(self, builder):
+        "Submit the operations collected by a non-flushing `BatchBuilder`."
+        txns, builder.txns = builder.txns, []
+        return await self.submit_many(txns, builder.max_batch_size, builder.pool)
+
+    async def join(self):
+        "Wait until every in-flight batch is settled."
+        while self._poller is not None and not self._poller.done():
+            await self._poller
+
+    def _register(self, batch_id, batch, futures, holds_slot):
+        self.in_flight[batch_id] = (time.monotonic(), futures, holds_slot)
+        for txn in batch.transactions:
+            txid = txn.header_signature
+            self.txns[txid] = (txn, batch_id)
+            for dependency in TransactionHeader.FromString(txn.header).dependencies:
+                if dependency in self.txns:
+                    self.dependents.setdefault(dependency, []).append(txid)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+
+    def _unregister(self, batch_id):
+        _, futures, holds_slot = self.in_flight.pop(batch_id)
+        if holds_slot:
+            self._slots.release()
+        for txid in futures:
+            self.txns.pop(txid, None)
+            self.dependents.pop(txid, None)
+        return futures
+
+    async def _post(self, batch_ids, batch_list_bytes):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.oper.request_txs, batch_list_bytes)
+        except Exception as e:
+            for batch_id in batch_ids:
+                if batch_id in self.in_flight:  # Not already dropped along with a failed dependency
+                    self._fail(batch_id, dict.fromkeys(self.in_flight[batch_id][1], e))
+
+    def _fail(self, batch_id, errors):
+        """
+        Fail the transactions of batch @batch_id named in @errors {txid: exception}, and resubmit
+        without them its other transactions and every in-flight transaction depending on a
+        dropped one, together with their batch-mates.
+        """
+        dropped = {batch_id}
+        queue = [batch_id]
+        while queue:
+            for txid in self.in_flight[queue.pop()][1]:
+                for dependent in self.dependents.get(txid, ()):
+                    if dependent not in self.txns:  # Settled already
+                        continue
+                    other = self.txns[dependent][1]
+                    if other not in dropped:
+                        dropped.add(other)
+                        queue.append(other)
+
+        txids = []  # Every dropped transaction, in submission order
+        orphans = []  # (transaction, future)
+        for other in [other for other in self.in_flight if other in dropped]:
+            txns = {txid: self.txns[txid] for txid in self.in_flight[other][1]}
+            for txid, future in self._unregister(other).items():
+                txids.append(txid)
+                if other == batch_id and txid in errors:
+                    future.set_exception(errors[txid])
+                else:
+                    orphans.append((txns[txid][0], future))
+        # Whether or not a validator rejected them, later transactions must not depend on these
+        self.oper.rollback(txids)
+
+        batches = []
+        for txn, future in orphans:
+            header = TransactionHeader.FromString(txn.header)
+            txn, _ = self.oper.generate_transaction(txn.payload, list(header.inputs), list(header.outputs))
+            new_batch_id, batch = self.oper.generate_batch(txn)
+            self._register(new_batch_id, batch, {txn.header_signature: future}, False)
+            batches.append((new_batch_id, batch))
+        if batches:
+            logger.info(f"Resubmitting {len(batches)} transactions dropped along with batch {batch_id}")
+            batch_list_bytes = BatchList(batches=[batch for _, batch in batches]).SerializeToString()
+            asyncio.ensure_future(self._post([new_batch_id for new_batch_id, _ in batches], batch_list_bytes))
+
+    async def _poll(self):
+        loop = asyncio.get_running_loop()
+        while self.in_flight:
+            await asyncio.sleep(self.poll_interval)
+            batch_ids = list(self.in_flight)
+            try:
+                statuses = await loop.run_in_executor(None, self.oper.get_batch_statuses, batch_ids)
+            except Exception as e:
+                logger.warning(f"Polling batch statuses failed: {e}")
+                statuses = {}
+            now = time.monotonic()
+            for batch_id in batch_ids:
+                if batch_id not in self.in_flight:  # Dropped along with a failed batch
+                    continue
+                submitted, futures, _ = self.in_flight[batch_id]
+                item = statuses.get(batch_id, {"status": "UNKNOWN"})
+                status = item["status"]
+                if status == "COMMITTED":
+                    self.oper.settle(futures)
+                    for txid, future in self._unregister(batch_id).items():
+                        future.set_result(txid)
+                elif status == "INVALID":
+                    errors = {
+                        tx["id"]: InvalidTransaction(tx.get("message") or f"Batch {batch_id} is invalid")
+                        for tx in item.get("invalid_transactions", []) if tx.get("id") in futures
+                    }
+                    self._fail(batch_id, errors or {txid: InvalidTransaction(f"Batch {batch_id} is invalid") for txid in futures})
+                elif now - submitted > self.timeout:
+                    for future in self._unregister(batch_id).values():
+                        future.set_exception(TimeoutError(f"Batch {batch_id} is still {status} after {self.timeout}s"))
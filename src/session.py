@@ -0,0 +1,69 @@
+import functools
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import constant
+from src import metrics
+
+_sessions = weakref.WeakSet()  # Live `PooledSession`s, summed by `connection_stats`
+
+
+class PooledSession(requests.Session):
+    """
+    `requests.Session` keeping up to @pool_size keep-alive connections per host,
+    with a default @timeout and retry/backoff for idempotent requests.
+    """
+    def __init__(self, pool_size=constant.HTTP_POOL_SIZE, timeout=constant.HTTP_TIMEOUT,
+                 retries=constant.HTTP_RETRIES, backoff_factor=constant.HTTP_BACKOFF):
+        super().__init__()
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.mount("http://", self.adapter)
+        self.mount("https://", self.adapter)
+        _sessions.add(self)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+    def connection_stats(self):
+        """
+        Return:
+            %stats: {"opened": new connections, "reused": requests served on a kept-alive one}
+        """
+        pools = self.adapter.poolmanager.pools
+        opened = requests_sent = 0
+        for key in list(pools.keys()):
+            pool = pools[key]
+            opened += pool.num_connections
+            requests_sent += pool.num_requests
+        return {"opened": opened, "reused": requests_sent - opened}
+
+
+def connection_stats():
+    "Sum `PooledSession.connection_stats` over every live session."
+    totals = {"opened": 0, "reused": 0}
+    for session in list(_sessions):
+        for key, value in session.connection_stats().items():
+            totals[key] += value
+    return totals
+
+
+metrics.counter_func("http_connections_opened_total", lambda: connection_stats()["opened"], "HTTP connections opened by pooled sessions.")
+metrics.counter_func("http_connections_reused_total", lambda: connection_stats()["reused"], "HTTP requests served on a kept-alive connection.")
+
+
+@functools.lru_cache(maxsize=None)
+def get_session(**kwargs):
+    "Return the process-wide session for these settings, shared by every `Operation`."
+    return PooledSession(**kwargs)
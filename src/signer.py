@@ -0,0 +1,125 @@
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+from sawtooth_sdk.protobuf.batch_pb2 import BatchHeader
+from sawtooth_signing import create_context, CryptoFactory
+from sawtooth_signing.secp256k1 import Secp256k1PrivateKey
+
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import itertools
+import logging
+import os
+import pathlib
+
+import constant
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_signer(key_file=constant.KEY_FILE):
+    """
+    Return the process-wide signer for @key_file, creating the key file on first use.
+    All `Operation`s share it, so the secp256k1 context and key are set up once per process.
+    """
+    context = create_context('secp256k1')
+    key_path = pathlib.Path(key_file)
+    if key_path.exists():
+        private_key = Secp256k1PrivateKey.from_hex(key_path.read_text().strip())
+    else:
+        private_key = context.new_random_private_key()
+        key_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(private_key.as_hex())
+        logger.info(f"New signing key written to {key_path}")
+    return CryptoFactory(context).new_signer(private_key)
+
+
+def transaction_header_bytes(family_name, family_version, inputs, outputs, public_key, dependencies, nonce, payload_sha512):
+    "Serialize a transaction header; the serial and the pooled signing paths both build headers here."
+    return TransactionHeader(
+        family_name=family_name,
+        family_version=family_version,
+        inputs=inputs,
+        outputs=outputs,
+        signer_public_key=public_key,
+        batcher_public_key=public_key,
+        dependencies=dependencies,
+        nonce=nonce,
+        payload_sha512=payload_sha512,
+    ).SerializeToString()
+
+
+def batch_header_bytes(public_key, transaction_ids):
+    return BatchHeader(signer_public_key=public_key, transaction_ids=transaction_ids).SerializeToString()
+
+
+def sign_transaction_headers(headers, signer):
+    "Return (header bytes, signature) of every argument tuple of `transaction_header_bytes` in @headers."
+    signed = []
+    for header in headers:
+        header_bytes = transaction_header_bytes(*header)
+        signed.append((header_bytes, signer.sign(header_bytes)))
+    return signed
+
+
+def sign_batch_headers(batches, signer):
+    "Return (header bytes, signature) of every (public key, transaction IDs) in @batches."
+    signed = []
+    for public_key, transaction_ids in batches:
+        header_bytes = batch_header_bytes(public_key, transaction_ids)
+        signed.append((header_bytes, signer.sign(header_bytes)))
+    return signed
+
+
+_worker_signer = None
+
+
+def _init_worker(private_key_hex):
+    global _worker_signer
+    context = create_context('secp256k1')
+    _worker_signer = CryptoFactory(context).new_signer(Secp256k1PrivateKey.from_hex(private_key_hex))
+
+
+def _sign_transaction_chunk(headers):
+    return sign_transaction_headers(headers, _worker_signer)
+
+
+def _sign_batch_chunk(batches):
+    return sign_batch_headers(batches, _worker_signer)
+
+
+class SigningPool:
+    """
+    Process pool serializing and signing headers with the key of @signer, @chunk_size headers
+    per work item so pickling costs stay small next to signing. secp256k1 signatures are
+    deterministic, so the output is the same as signing in-process.
+    """
+    def __init__(self, signer, workers=None, chunk_size=constant.SIGN_CHUNK):
+        self.chunk_size = chunk_size
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(signer._private_key.as_hex(),),  # Signer exposes no public accessor for its key
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def map(self, func, items):
+        chunks = [items[start:start + self.chunk_size] for start in range(0, len(items), self.chunk_size)]
+        return list(itertools.chain.from_iterable(self.executor.map(func, chunks)))
+
+    def sign_transactions(self, headers):
+        "Pooled `sign_transaction_headers`."
+        return self.map(_sign_transaction_chunk, headers)
+
+    def sign_batches(self, batches):
+        "Pooled `sign_batch_headers`."
+        return self.map(_sign_batch_chunk, batches)
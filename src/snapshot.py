@@ -0,0 +1,137 @@
+"""
+Columnar snapshots of the bank namespace for reporting.
+
+A snapshot holds three aligned NumPy arrays, one entry per account (shards summed):
+balances (int64), names and addresses (fixed-width unicode), plus the block ID it was
+read at. It is saved as one `.npy` file per column and a `head` file in a directory,
+and every aggregate is computed on the arrays rather than in Python loops.
+"""
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+
+import constant
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("names", "addresses", "balances")
+PERCENTILES = (50, 90, 99)
+
+
+class Snapshot:
+    def __init__(self, names, addresses, balances, head=None):
+        self.names = names
+        self.addresses = addresses
+        self.balances = balances
+        self.head = head
+
+    def __len__(self):
+        return len(self.balances)
+
+    @classmethod
+    def take(cls, oper, head=None):
+        "Stream every account of the namespace at block @head, the chain head if None."
+        from src.wallet import merge_shards
+        names = []
+        addresses = []
+        balances = []
+        for address, account in merge_shards(oper.iter_accounts(head=head)):
+            names.append(account["name"])
+            addresses.append(address)
+            balances.append(account["balance"])
+        order = np.argsort(np.array(addresses, dtype=str), kind="stable")
+        return cls(
+            np.array(names, dtype=str)[order],
+            np.array(addresses, dtype=f"<U{constant.ADDRESS_PREFIX_LEN + constant.ADDRESS_SUFFIX_LEN}")[order],
+            np.array(balances, dtype=np.int64)[order],
+            head or oper.state_head,
+        )
+
+    def save(self, directory):
+        "Write the snapshot to @directory, replacing it as a whole so a crash never leaves half a snapshot."
+        directory = pathlib.Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp = pathlib.Path(tempfile.mkdtemp(dir=directory.parent, prefix=f".{directory.name}."))
+        for column in COLUMNS:
+            np.save(tmp / f"{column}.npy", getattr(self, column), allow_pickle=False)
+        (tmp / "head").write_text(self.head or "")
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(tmp, directory)
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        directory = pathlib.Path(directory)
+        columns = [np.load(directory / f"{column}.npy", allow_pickle=False) for column in COLUMNS]
+        return cls(*columns, head=(directory / "head").read_text() or None)
+
+    def stats(self, top=constant.TOP_N, percentiles=PERCENTILES):
+        """
+        Return:
+            %stats: accounts, total, mean, min, max, {percentile: balance} and the @top richest (name, balance)
+        """
+        if not len(self):
+            return {"accounts": 0, "total": 0, "mean": 0, "min": None, "max": None,
+                    "percentiles": {}, "top": []}
+        top = min(top, len(self))
+        if top > 0:
+            richest = np.argpartition(self.balances, -top)[-top:]
+            richest = richest[np.argsort(self.balances[richest], kind="stable")[::-1]]
+        else:  # [-0:] would select every account
+            richest = np.array([], dtype=np.intp)
+        return {
+            "accounts": len(self),
+            "total": int(self.balances.sum()),
+            "mean": float(self.balances.mean()),
+            "min": int(self.balances.min()),
+            "max": int(self.balances.max()),
+            "percentiles": dict(zip(percentiles, np.percentile(self.balances, percentiles).tolist())),
+            "top": list(zip(self.names[richest].tolist(), self.balances[richest].tolist())),
+        }
+
+    def diff(self, newer, top=constant.TOP_N):
+        """
+        Compare with the @newer snapshot, accounts matched by address.
+        Return:
+            %diff: created/purged/changed account counts, net change of the total and
+                   the @top largest moves (name, old balance, new balance), old balance None if created
+        """
+        common, old_index, new_index = np.intersect1d(self.addresses, newer.addresses, assume_unique=True, return_indices=True)
+        created = ~np.isin(newer.addresses, common, assume_unique=True)
+        purged = ~np.isin(self.addresses, common, assume_unique=True)
+        delta = newer.balances[new_index] - self.balances[old_index]
+        changed = delta != 0
+
+        names = np.concatenate([newer.names[new_index][changed], newer.names[created], self.names[purged]])
+        old = np.concatenate([self.balances[old_index][changed], np.zeros(created.sum(), np.int64), self.balances[purged]])
+        new = np.concatenate([newer.balances[new_index][changed], newer.balances[created], np.zeros(purged.sum(), np.int64)])
+        kind = np.concatenate([np.zeros(changed.sum(), np.int8), np.ones(created.sum(), np.int8), np.full(purged.sum(), 2, np.int8)])
+        moves = np.argsort(-np.abs(new - old), kind="stable")[:max(top, 0)]
+        return {
+            "from": self.head,
+            "to": newer.head,
+            "created": int(created.sum()),
+            "purged": int(purged.sum()),
+            "changed": int(changed.sum()),
+            "net": int(newer.balances.sum() - self.balances.sum()),
+            "top": [
+                (str(names[i]), None if kind[i] == 1 else int(old[i]), None if kind[i] == 2 else int(new[i]))
+                for i in moves
+            ],
+        }
+
+
+def default_path(head):
+    return pathlib.Path(constant.SNAPSHOT_DIR) / (head[:16] if head else "latest")
+
+
+def resolve(oper, source):
+    "Load the snapshot saved at @source, or take one at block @source if no such directory exists."
+    if pathlib.Path(source).is_dir():
+        return Snapshot.load(source)
+    return Snapshot.take(oper, head=source)
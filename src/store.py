@@ -0,0 +1,204 @@
+import atexit
+import functools
+import logging
+import pathlib
+import sqlite3
+import threading
+
+import constant
+from src.addressing import get_address
+
+logger = logging.getLogger(__name__)
+
+
+class AccountStore:
+    """
+    Local account cache in a single SQLite database, keyed by name and by address.
+    Sharded accounts also keep one row per shard in `shards`, their `accounts` row holds the sum.
+    Every write runs in its own transaction and the database uses write-ahead logging,
+    so a crash leaves either the old or the new rows, never a truncated record.
+    """
+    def __init__(self, path=constant.CACHE_DB):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS accounts ("
+                "name TEXT PRIMARY KEY, address TEXT NOT NULL UNIQUE, balance INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS shards ("
+                "address TEXT PRIMARY KEY, name TEXT NOT NULL, balance INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS shards_name ON shards (name)")
+
+    def get(self, name):
+        "Return {name: , address: , balance: } of account @name, or None if not cached."
+        row = self.conn.execute("SELECT * FROM accounts WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_by_address(self, address):
+        row = self.conn.execute("SELECT * FROM accounts WHERE address = ?", (address,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def upsert(self, name, address, balance):
+        self.upsert_many([(name, address, balance)])
+
+    def upsert_many(self, rows):
+        "Insert or update every (name, address, balance) in @rows within one transaction."
+        self.apply_delta(rows, ())
+
+    def delete(self, name):
+        with self.conn:
+            self.conn.execute("DELETE FROM accounts WHERE name = ?", (name,))
+            self.conn.execute("DELETE FROM shards WHERE name = ?", (name,))
+
+    def apply_delta(self, rows, deleted, meta=None):
+        """
+        Upsert (name, address, balance) @rows, delete accounts at @deleted addresses and
+        set @meta {key: value} in one transaction, so a resume point never runs ahead of the data.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO accounts (name, address, balance) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET address = excluded.address, balance = excluded.balance",
+                rows,
+            )
+            self.conn.executemany(
+                "DELETE FROM shards WHERE name IN (SELECT name FROM accounts WHERE address = ?)",
+                ((address,) for address in deleted),
+            )
+            self.conn.executemany("DELETE FROM accounts WHERE address = ?", ((address,) for address in deleted))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (meta or {}).items(),
+            )
+
+    def apply_states(self, states, deleted, meta=None):
+        """
+        Apply (name, address, balance) state records and @deleted addresses as read from the chain,
+        and set @meta, in one transaction. Unlike `apply_delta` rows, a record may be one shard of
+        an account; shards are kept per address and the account's balance becomes their sum.
+        """
+        with self.conn:
+            sharded = set()
+            for name, address, balance in states:
+                if name in sharded or self.is_sharded(name):
+                    sharded.add(name)
+                elif address == get_address(name):
+                    self.conn.execute(
+                        "INSERT INTO accounts (name, address, balance) VALUES (?, ?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET address = excluded.address, balance = excluded.balance",
+                        (name, address, balance),
+                    )
+                    continue
+                else:  # First shard seen, the cached balance so far is shard 0
+                    sharded.add(name)
+                    self.conn.execute("INSERT INTO shards SELECT address, name, balance FROM accounts WHERE name = ?", (name,))
+                self.conn.execute(
+                    "INSERT INTO shards (address, name, balance) VALUES (?, ?, ?) "
+                    "ON CONFLICT(address) DO UPDATE SET name = excluded.name, balance = excluded.balance",
+                    (address, name, balance),
+                )
+            for address in deleted:
+                row = self.conn.execute("SELECT name FROM shards WHERE address = ?", (address,)).fetchone()
+                if row is not None:
+                    sharded.add(row[0])
+                    self.conn.execute("DELETE FROM shards WHERE address = ?", (address,))
+                self.conn.execute("DELETE FROM accounts WHERE address = ?", (address,))
+            for name in sharded:
+                self.conn.execute(
+                    "INSERT INTO accounts (name, address, balance) "
+                    "SELECT ?, ?, SUM(balance) FROM shards WHERE name = ? HAVING COUNT(*) > 0 "
+                    "ON CONFLICT(name) DO UPDATE SET balance = excluded.balance",
+                    (name, get_address(name), name),
+                )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (meta or {}).items(),
+            )
+
+    def is_sharded(self, name):
+        return self.conn.execute("SELECT 1 FROM shards WHERE name = ? LIMIT 1", (name,)).fetchone() is not None
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def __iter__(self):
+        for row in self.conn.execute("SELECT * FROM accounts ORDER BY name"):
+            yield dict(row)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+
+@functools.lru_cache(maxsize=None)
+def get_store(path=constant.CACHE_DB):
+    "Return the process-wide store for @path, shared by every `Wallet` and `Admin`."
+    return AccountStore(path)
+
+
+class WriteBehind:
+    """
+    Coalescing write-behind layer in front of @store for `Wallet`'s per-operation cache writes.
+
+    Writes only mark an account dirty in memory; repeated writes to one account collapse into
+    its latest row. Dirty rows go to the store in a single transaction once @max_dirty accounts
+    are dirty, from a daemon timer @max_delay seconds after the oldest unflushed write, so an idle
+    process does not keep them from other readers of the database, and at exit.
+    Reads through `get` see the pending rows.
+    """
+    def __init__(self, store, max_dirty=constant.WRITE_BEHIND_SIZE, max_delay=constant.WRITE_BEHIND_DELAY):
+        self.store = store
+        self.max_dirty = max_dirty
+        self.max_delay = max_delay
+        self.dirty = {}  # name -> (name, address, balance)
+        self.timer = None  # Flushes @max_delay seconds after the oldest dirty write
+        self.lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def get(self, name):
+        with self.lock:
+            row = self.dirty.get(name)
+        if row is None:
+            return self.store.get(name)
+        return dict(zip(("name", "address", "balance"), row))
+
+    def upsert(self, name, address, balance):
+        with self.lock:
+            self.dirty[name] = (name, address, balance)
+            if len(self.dirty) >= self.max_dirty:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def delete(self, name):
+        with self.lock:
+            self.dirty.pop(name, None)
+            self.store.delete(name)
+
+    def flush(self):
+        "Write every dirty account in one transaction."
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            rows = list(self.dirty.values())
+            self.store.upsert_many(rows)
+            self.dirty.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_write_behind(path=constant.CACHE_DB):
+    "Return the process-wide write-behind layer over `get_store(path)`."
+    return WriteBehind(get_store(path))
@@ -1,106 +1,314 @@
-from sawtooth_signing import create_context, CryptoFactory
 from hashlib import sha512
-from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader, Transaction
-from sawtooth_sdk.protobuf.batch_pb2 import BatchHeader, Batch, BatchList
+from sawtooth_sdk.protobuf.transaction_pb2 import Transaction
+from sawtooth_sdk.protobuf.batch_pb2 import Batch, BatchList
 from sawtooth_sdk.processor.exceptions import InvalidTransaction
 
-import json
-import requests
 import urllib
-from urllib.error import HTTPError
-import random
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import itertools
 import logging
-import pathlib
+import os
+import random
 import time
-import struct
+
+import requests
 import base64
+import functools
 
 import constant
+from src.signer import get_signer, transaction_header_bytes, batch_header_bytes, sign_transaction_headers
+from src.session import get_session
+from src.store import get_store, get_write_behind
+from src import codec
+from src import metrics
+from src import addressing
 
 logger = logging.getLogger(__name__)
 
+SERIALIZE_SECONDS = metrics.histogram("client_serialize_seconds", "Time to encode a payload or serialize a header.")
+SIGN_SECONDS = metrics.histogram("client_sign_seconds", "Time to sign a transaction or batch header.")
+POST_SECONDS = metrics.histogram("client_post_seconds", "Time of one POST /batches request.")
+COMMIT_WAIT_SECONDS = metrics.histogram("client_commit_wait_seconds", "Time spent waiting for batches to commit.")
+TRANSACTIONS = metrics.counter("client_transactions_total", "Transactions signed.")
+BATCHES = metrics.counter("client_batches_total", "Batches signed.")
+SUBMIT_RETRIES = metrics.counter("client_submit_retries_total", "POST /batches attempts retried.")
+
+# An operation queued on a deferring `BatchBuilder`, signed when the builder flushes or is submitted
+Unsigned = collections.namedtuple("Unsigned", ["payload", "inputs", "outputs", "nonce", "idempotency_key"])
+
 
 class Operation:
-    def __init__(self, version="1.1"):
-        self.family_name = "bank"
-        self.family_prefix = sha512(self.family_name.encode()).hexdigest()[:constant.ADDRESS_PREFIX_LEN]
+    def __init__(self, version="1.2", signer=None, session=None, base_url=constant.REST_API_URL, cache_ttl=0, wait=True, shards=None):
+        self.family_name = addressing.FAMILY_NAME
+        self.family_prefix = addressing.FAMILY_PREFIX
         self.family_version = version
-        context = create_context('secp256k1')
-        private_key = context.new_random_private_key()
-        self.signer = CryptoFactory(context).new_signer(private_key)
+        self.signer = signer or get_signer()
         self.signer_public_key = self.signer.get_public_key().as_hex()
-        self.base_url = "http://127.0.0.1:8008" 
-
-    def generate_transaction(self, payload, inputs=None, outputs=None):
-        payload = payload.encode()
-        tx_dic = dict(
-            family_name=self.family_name,
-            family_version=self.family_version,
-            inputs=inputs,
-            outputs=outputs,
-            signer_public_key=self.signer_public_key,
-            batcher_public_key=self.signer_public_key,
-            dependencies=[],
-            nonce=str(random.randint(0, 1000000)),
-            payload_sha512=sha512(payload).hexdigest(),
-        )
-        txn_header_bytes = TransactionHeader(**tx_dic).SerializeToString()
-        transaction_id = self.signer.sign(txn_header_bytes)
+        self.session = session or get_session()
+        self.base_url = base_url
+        self.batcher = None
+        self.cache_ttl = cache_ttl
+        self.balance_cache = {}  # address stem -> (expiry, balance)
+        self.shards = dict(shards or {})  # name -> shard count of hot accounts, see `shard_count`
+        self.wait = wait
+        self.last_txids = {}  # address -> ID of the last transaction submitted on it, until it settles
+        self.superseded = {}  # ID of an unsettled transaction -> {address: ID it replaced in last_txids}
+        self.outstanding = {}  # batch ID submitted without waiting for its commit -> IDs of its transactions
+        self.nonce_prefix = f"{time.time_ns():x}.{os.getpid():x}."
+        self.nonces = itertools.count()
+        self.issued = collections.OrderedDict()  # idempotency key -> transaction
+        self.state_head = None  # block ID the last `iter_state` read was served at
+
+    def generate_transaction(self, payload, inputs=None, outputs=None, nonce=None):
+        """
+        The transaction depends on the last transaction submitted on any address it touches,
+        so operations on one account can be submitted back-to-back without waiting for commits.
+        @nonce defaults to the next value of a per-process monotonic counter.
+        """
+        inputs = inputs or []
+        outputs = outputs or []
+        dependencies = sorted({self.last_txids[address] for address in [*inputs, *outputs] if address in self.last_txids})
+        with SERIALIZE_SECONDS.time():
+            txn_header_bytes = transaction_header_bytes(
+                self.family_name, self.family_version, inputs, outputs, self.signer_public_key,
+                dependencies, nonce or self.next_nonce(), sha512(payload).hexdigest(),
+            )
+        with SIGN_SECONDS.time():
+            transaction_id = self.signer.sign(txn_header_bytes)
         txn = Transaction(
             header=txn_header_bytes,
             header_signature=transaction_id,
             payload=payload,
         )
+        self.track(transaction_id, outputs)
+        TRANSACTIONS.inc()
+        metrics.profiler.tick()
         return txn, transaction_id
-    
-    def generate_batch_list(self, *txns):
+
+    def next_nonce(self):
+        return f"{self.nonce_prefix}{next(self.nonces)}"
+
+    def sign_transactions(self, entries, pool=None):
+        """
+        Sign the `Unsigned` operations among @entries and return all of them as transactions, in order.
+        Dependencies are resolved as `generate_transaction` would one after the other, so the
+        transactions are byte-identical to the serial path. With a `SigningPool` @pool, operations
+        are signed on its workers in waves: each wave holds the operations whose dependencies
+        were all signed in earlier waves.
+        """
+        waves = []
+        dependencies = {}  # entry index -> (indices of entries it depends on, IDs of earlier transactions)
+        wave_of = {}  # entry index -> wave
+        writers = {}  # address -> index of the last entry writing it
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, Unsigned):
+                continue
+            depends_on = set()
+            known = set()
+            wave = 0
+            for address in [*entry.inputs, *entry.outputs]:
+                if address in writers:
+                    depends_on.add(writers[address])
+                    wave = max(wave, wave_of[writers[address]] + 1)
+                elif address in self.last_txids:
+                    known.add(self.last_txids[address])
+            dependencies[index] = (depends_on, known)
+            wave_of[index] = wave
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(index)
+            for address in entry.outputs:
+                writers[address] = index
+
+        txns = list(entries)
+        for wave in waves:
+            headers = []
+            for index in wave:
+                entry = entries[index]
+                depends_on, known = dependencies[index]
+                headers.append((
+                    self.family_name, self.family_version, entry.inputs, entry.outputs, self.signer_public_key,
+                    sorted(known | {txns[i].header_signature for i in depends_on}), entry.nonce, sha512(entry.payload).hexdigest(),
+                ))
+            signed = pool.sign_transactions(headers) if pool is not None else sign_transaction_headers(headers, self.signer)
+            for index, (header_bytes, transaction_id) in zip(wave, signed):
+                txns[index] = Transaction(header=header_bytes, header_signature=transaction_id, payload=entries[index].payload)
+
+        for entry, txn in zip(entries, txns):
+            if isinstance(entry, Unsigned):
+                self.track(txn.header_signature, entry.outputs)
+                if entry.idempotency_key is not None:
+                    self.remember(entry.idempotency_key, txn)
+        TRANSACTIONS.inc(len(dependencies))
+        return txns
+
+    def track(self, txid, outputs):
+        "Make later transactions on @outputs depend on @txid until it settles."
+        self.superseded[txid] = {address: self.last_txids.get(address) for address in outputs}
+        for address in outputs:
+            self.last_txids[address] = txid
+
+    def settle(self, txids):
+        "Stop depending on @txids once they are COMMITTED or INVALID: a validator has decided them either way."
+        for txid in txids:
+            for address in self.superseded.pop(txid, ()):
+                if self.last_txids.get(address) == txid:
+                    del self.last_txids[address]
+
+    def rollback(self, txids):
+        "Untrack @txids whose submission failed, so later transactions depend on what they replaced again."
+        for txid in reversed(list(txids)):
+            for address, previous in self.superseded.pop(txid, {}).items():
+                if self.last_txids.get(address) != txid:
+                    continue
+                if previous in self.superseded:
+                    self.last_txids[address] = previous
+                else:
+                    del self.last_txids[address]
+
+    def remember(self, idempotency_key, tx):
+        self.issued[idempotency_key] = tx
+        if len(self.issued) > constant.IDEMPOTENCY_CACHE_SIZE:
+            self.issued.popitem(last=False)
+
+    def generate_batch(self, *txns):
         """
         Return:
             @batch_sig: Batch ID
-            @batch_list_bytes: Batch data
+            @batch: Signed batch holding @txns
         """
-        batch_header_bytes = BatchHeader(
-            signer_public_key=self.signer_public_key,
-            transaction_ids=[txn.header_signature for txn in txns],
-        ).SerializeToString()
+        with SERIALIZE_SECONDS.time():
+            header_bytes = batch_header_bytes(self.signer_public_key, [txn.header_signature for txn in txns])
 
-        batch_sig = self.signer.sign(batch_header_bytes)
+        with SIGN_SECONDS.time():
+            batch_sig = self.signer.sign(header_bytes)
+        BATCHES.inc()
         batch = Batch(
-            header=batch_header_bytes,
+            header=header_bytes,
             header_signature=batch_sig,
             transactions=txns,
         )
+        return batch_sig, batch
+
+    def generate_batches(self, txns, max_batch_size=constant.MAX_BATCH_SIZE, pool=None):
+        """
+        Split @txns into batches of at most @max_batch_size, headers signed on @pool if given.
+        Return:
+            %batches: list of (batch ID, batch)
+        """
+        chunks = [txns[start:start + max_batch_size] for start in range(0, len(txns), max_batch_size)]
+        if pool is None:
+            return [self.generate_batch(*chunk) for chunk in chunks]
+        signed = pool.sign_batches([(self.signer_public_key, [txn.header_signature for txn in chunk]) for chunk in chunks])
+        BATCHES.inc(len(chunks))
+        return [
+            (batch_sig, Batch(header=header_bytes, header_signature=batch_sig, transactions=chunk))
+            for chunk, (header_bytes, batch_sig) in zip(chunks, signed)
+        ]
+
+    def generate_batch_list(self, *txns):
+        """
+        Return:
+            @batch_sig: Batch ID
+            @batch_list_bytes: Batch data
+        """
+        batch_sig, batch = self.generate_batch(*txns)
         batch_list_bytes = BatchList(batches=[batch]).SerializeToString()
         return batch_sig, batch_list_bytes
 
-    def request_txs(self, batch_list_bytes):
-        try:
-            batch_url = urllib.parse.urljoin(self.base_url, "batches")
-            response = requests.post(
-                batch_url,
-                data=batch_list_bytes,
-                headers={"Content-Type": "application/octet-stream"},
-            )
-        except HTTPError as e:
-            print(e)
-        else:
-            res_js = response.json()
-            status_link = res_js["link"]
-        
+    def batch(self, max_batch_size=constant.MAX_BATCH_SIZE, autoflush=True, pool=None, defer=False):
+        "Collect operations issued inside a `with` block and submit them together on exit."
+        return BatchBuilder(self, max_batch_size, autoflush, pool, defer)
+
+    def request_txs(self, batch_list_bytes, retries=constant.SUBMIT_RETRIES, backoff=constant.SUBMIT_BACKOFF):
+        """
+        Submit @batch_list_bytes, retrying with exponential backoff on HTTP 429/503, timeouts
+        and dropped connections. Resubmitting is safe since the same bytes carry the same batch IDs.
+        Return:
+            %link: batch status link returned by the REST API
+        """
+        batch_url = urllib.parse.urljoin(self.base_url, "batches")
+        for attempt in range(retries + 1):
+            try:
+                with POST_SECONDS.time():
+                    response = self.session.post(
+                        batch_url,
+                        data=batch_list_bytes,
+                        headers={"Content-Type": "application/octet-stream"},
+                    )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                delay = backoff * 2 ** attempt
+            else:
+                if response.status_code not in (429, 503):
+                    response.raise_for_status()
+                    return response.json()["link"]
+                error = requests.HTTPError(f"{response.status_code} from {batch_url}", response=response)
+                retry_after = response.headers.get("Retry-After", "")
+                delay = int(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+            if attempt < retries:
+                SUBMIT_RETRIES.inc()
+                logger.warning(f"Submitting batches failed ({error}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+        raise error
+
+
+    def encode(self, op_dic):
+        with SERIALIZE_SECONDS.time():
+            return codec.encode_payload(op_dic, self.family_version)
+
     def get_address(self, name):
-        return self.family_prefix + sha512(name.encode()).hexdigest()[:constant.ADDRESS_SUFFIX_LEN]
+        return addressing.get_address(name)
+
+    def shard_count(self, name):
+        """
+        Number of shards account @name is split into, 1 unless registered in `self.shards`.
+        Credits to a sharded account land on a random shard, so they do not conflict with
+        each other; debits and queries read every shard.
+        """
+        return self.shards.get(name, 1)
+
+    def pick_shard(self, name):
+        "Return (shard index, shard address) for a credit to @name."
+        shard = random.randrange(self.shard_count(name))
+        return shard, addressing.shard_addresses(name, shard + 1)[shard]
 
     def transaction(func):
-        def wrapper(self, *args, **kwargs):
+        """
+        Sign and submit the (payload, inputs, outputs) built by @func. Operations issued again
+        with the same `idempotency_key` resubmit the transaction built the first time, so a
+        retry after a timeout cannot apply twice.
+        """
+        @functools.wraps(func)
+        def wrapper(self, *args, idempotency_key=None, **kwargs):
             payload, inputs, outputs = func(self, *args, **kwargs)
-            tx, txid = self.generate_transaction(payload, inputs, outputs)
+            for address in outputs:
+                self.balance_cache.pop(addressing.stem(address), None)
+            nonce = f"key:{idempotency_key}" if idempotency_key is not None else None
+            if self.batcher is not None and idempotency_key in self.batcher.keys:  # Queued already, maybe unsigned yet
+                tx = self.issued.get(idempotency_key)
+                return (tx.header_signature if tx is not None else None), None
+            if idempotency_key is not None and idempotency_key in self.issued:
+                tx = self.issued[idempotency_key]
+                txid = tx.header_signature
+            elif self.batcher is not None and self.batcher.defer:  # Signed when the batcher flushes
+                self.batcher.add(Unsigned(payload, inputs, outputs, nonce or self.next_nonce(), idempotency_key), idempotency_key)
+                return None, None
+            else:
+                tx, txid = self.generate_transaction(payload, inputs, outputs, nonce)
+                if idempotency_key is not None:
+                    self.remember(idempotency_key, tx)
+            if self.batcher is not None:  # Deferred until the batcher flushes
+                self.batcher.add(tx, idempotency_key)
+                return txid, None
             batch_id, batch_bytes = self.generate_batch_list(tx)
-            self.request_txs(batch_bytes)
             try:
-                print("Retrieving batch status...")
-                self.verify_batch_commit_status(batch_id)
-            except HTTPError as e:
-                print(e)
+                self.request_txs(batch_bytes)
+            except Exception:
+                self.rollback([txid])
+                raise
+            self.await_commit({batch_id: [txid]})
             return txid, batch_id
         return wrapper
 
@@ -120,7 +328,7 @@ class Operation:
     def check_batch_status(self, batch_id):
         batch_status_url = urllib.parse.urljoin(self.base_url, "batch_statuses")
         query_data = {"id": batch_id}
-        response = requests.get(
+        response = self.session.get(
             batch_status_url,
             params=query_data,
         )
@@ -134,10 +342,12 @@ class Operation:
             "balance": default_balance,
         }
         inputs = outputs = self.get_address(name)
-        return json.dumps(op_dic), [inputs], [outputs]
+        return self.encode(op_dic), [inputs], [outputs]
 
     @transaction
     def transfer_money(self, src, dst, amount):
+        if self.shard_count(src.name) > 1 or self.shard_count(dst.name) > 1:
+            return self.sharded_transfer(src.name, dst.name, amount)
         sender_addr = self.get_address(src.name)
         receiver_addr = self.get_address(dst.name)
         op_dic = {
@@ -147,146 +357,458 @@ class Operation:
             "amount": amount,
         }
         inputs = outputs = [sender_addr, receiver_addr]
-        return json.dumps(op_dic), inputs, outputs
+        return self.encode(op_dic), inputs, outputs
+
+    def sharded_transfer(self, sender, receiver, amount):
+        shards = self.shard_count(sender)
+        shard, shard_address = self.pick_shard(receiver)
+        op_dic = {
+            "typ": "sharded_transfer",
+            "sender": sender,
+            "shards": shards,
+            "receiver": receiver,
+            "shard": shard,
+            "amount": amount,
+        }
+        sender_addresses = list(addressing.shard_addresses(sender, shards))
+        inputs = sorted({*sender_addresses, self.get_address(receiver), shard_address})
+        outputs = sorted({*sender_addresses, shard_address})
+        return self.encode(op_dic), inputs, outputs
+
+    @transaction
+    def multi_transfer(self, src, legs):
+        "Transfer from @src to every (dst, amount) in @legs within one transaction. Sharded receivers are credited on shard 0."
+        if self.shard_count(src.name) > 1:
+            raise ValueError(f"Account {src.name} is sharded, multi_transfer needs an unsharded sender")
+        op_dic = {
+            "typ": "multi_transfer",
+            "sender": src.name,
+            "receivers": [[dst.name, amount] for dst, amount in legs],
+        }
+        addresses = {self.get_address(name) for name in [src.name, *(dst.name for dst, _ in legs)]}
+        inputs = outputs = sorted(addresses)
+        return self.encode(op_dic), inputs, outputs
 
     @receipt
     @transaction
-    def get_balance(self, name):
+    def query_account(self, name, key="balance"):
+        "Query @key through a transaction, so the read is recorded in a receipt on chain."
+        shards = self.shard_count(name)
+        if shards > 1:
+            op_dic = {
+                "typ": "sharded_query",
+                "name": name,
+                "key": key,
+                "shards": shards,
+            }
+            return self.encode(op_dic), list(addressing.shard_addresses(name, shards)), []
         op_dic = {
             "typ": "query",
             "name": name,
-            "key": "balance",
+            "key": key,
         }
         inputs = self.get_address(name)
-        return json.dumps(op_dic), [inputs], []
+        return self.encode(op_dic), [inputs], []
 
-    def get_list(self):
+    def get_state(self, address):
+        "Return the state data at @address, or None if nothing is stored there."
+        state_url = urllib.parse.urljoin(self.base_url, f"state/{address}")
+        response = self.session.get(state_url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return base64.b64decode(response.json()["data"])
+
+    def get_balance(self, name):
+        "Read the balance of @name from state, None if the account does not exist."
+        return self.get_balances([name])[name]
+
+    def get_balances(self, names, workers=constant.READ_WORKERS, sharded=()):
+        """
+        Read the balances of many accounts from state, one address at a time on up to @workers
+        threads, so the cost follows the number of uncached accounts rather than the namespace size.
+        Accounts registered in `self.shards` or named in @sharded are summed over their shards,
+        which one read of their address stem returns whatever the shard count.
+        Return:
+            %balances: {name: balance or None}
+        """
+        now = time.monotonic()
+        sharded = set(sharded).union(name for name in self.shards if self.shard_count(name) > 1)
+        balances = {}
+        wanted = {}
+        for name in names:
+            address = self.get_address(name)
+            expiry, balance = self.balance_cache.get(addressing.stem(address), (0, None))
+            if expiry > now:
+                balances[name] = balance
+            else:
+                wanted[address] = name
+        read = functools.partial(self.read_account, sharded=sharded)
+        if workers > 1 and len(wanted) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fetched = dict(zip(wanted, executor.map(read, wanted.items())))
+        else:
+            fetched = dict(zip(wanted, map(read, wanted.items())))
+        for address, name in wanted.items():
+            shards = fetched[address]
+            balance = sum(codec.decode_account(data)["balance"] for data in shards.values()) if address in shards else None
+            if self.cache_ttl > 0:
+                self.balance_cache[addressing.stem(address)] = (now + self.cache_ttl, balance)
+            balances[name] = balance
+        return balances
+
+    def read_account(self, item, sharded=()):
+        "Return {address: state data} of the (address, name) @item, with every shard if @name is in @sharded."
+        address, name = item
+        if name in sharded:
+            return dict(self.iter_state(prefix=addressing.stem(address)))
+        data = self.get_state(address)
+        return {address: data} if data else {}
+
+    def iter_state(self, prefix=None, head=None, limit=constant.PAGE_LIMIT):
+        """
+        Yield (address, data bytes) of every state entry under @prefix, following the
+        REST API's paging one page at a time. All pages are read at the head of the first one,
+        which is kept in `self.state_head`.
+        """
         state_url = urllib.parse.urljoin(self.base_url, "state")
         query = {
-            "address": self.family_prefix,
+            "address": prefix or self.family_prefix,
+            "limit": limit,
         }
-        response = requests.get(
-            state_url,
-            params=query,
-        )
-        if response.status_code == requests.codes.ok:
-            ret_data = {}
-            data = response.json()["data"]
-            for item in data:
-                address = item["address"]
-                value = json.loads(
-                    base64.b64decode(item["data"]).decode()
-                )
-                ret_data[address] = value
-            return ret_data
-        else:
+        if head is not None:
+            query["head"] = head
+        while True:
+            response = self.session.get(
+                state_url,
+                params=query,
+            )
             response.raise_for_status()
+            page = response.json()
+            self.state_head = page.get("head")
+            for item in page["data"]:
+                yield item["address"], base64.b64decode(item["data"])
+            next_position = page.get("paging", {}).get("next_position")
+            if not next_position:
+                return
+            query["head"] = page["head"]
+            query["start"] = next_position
+
+    def iter_accounts(self, head=None):
+        "Yield (address, {name: , balance: }) of every account, decoded lazily."
+        for address, data in self.iter_state(head=head):
+            account = codec.decode_account(data)
+            addressing.names.learn(address, account["name"])
+            yield address, account
+
+    def get_list(self):
+        return dict(self.iter_accounts())
 
     @transaction
     def deposit(self, name, amount):
+        shards = self.shard_count(name)
+        if shards > 1:
+            return self.sharded_change(name, amount, shards)
         op_dic = {
             "typ": "change",
             "name": name,
             "amount": amount,
         }
         inputs = outputs = self.get_address(name)
-        return json.dumps(op_dic), [inputs], [outputs]
+        return self.encode(op_dic), [inputs], [outputs]
+
+    def sharded_change(self, name, amount, shards):
+        "A credit reads the account's own address and writes one shard, a debit reads and writes all of them."
+        if amount >= 0:
+            shard, shard_address = self.pick_shard(name)
+            inputs, outputs = sorted({self.get_address(name), shard_address}), [shard_address]
+        else:
+            shard = 0
+            inputs = outputs = list(addressing.shard_addresses(name, shards))
+        op_dic = {
+            "typ": "sharded_change",
+            "name": name,
+            "amount": amount,
+            "shard": shard,
+            "shards": shards,
+        }
+        return self.encode(op_dic), inputs, outputs
 
-    def withdraw(self, name, amount):
-        return self.deposit(name, -amount)
+    def withdraw(self, name, amount, **kwargs):
+        return self.deposit(name, -amount, **kwargs)
 
     @transaction
     def purge(self, name):
+        shards = self.shard_count(name)
+        if shards > 1:
+            op_dic = {
+                "typ": "sharded_purge",
+                "name": name,
+                "shards": shards,
+            }
+            inputs = outputs = list(addressing.shard_addresses(name, shards))
+            return self.encode(op_dic), inputs, outputs
         op_dic = {
             "typ": "purge",
             "name": name,
         }
         inputs = outputs = self.get_address(name)
-        return json.dumps(op_dic), [inputs], [outputs]
+        return self.encode(op_dic), [inputs], [outputs]
 
     def fetch_receipt(self, txid):
         receipt_url = urllib.parse.urljoin(self.base_url, "receipts")
         params = {
             "id": txid,
         }
-        response = requests.get(
+        response = self.session.get(
             receipt_url,
             params=params,
         )
         return response.json()["data"]
 
+    def get_batch_statuses(self, batch_ids, wait=None):
+        """
+        Fetch the statuses of many batches in one request, long-polling up to @wait seconds
+        for them to settle; the read timeout is extended by @wait so the poll can run its course.
+        Return:
+            %statuses: {batch_id: status_item}
+        """
+        status_url = urllib.parse.urljoin(self.base_url, "batch_statuses")
+        params = {"wait": wait} if wait else None
+        timeout = {"timeout": wait + constant.HTTP_TIMEOUT} if wait else {}
+        response = self.session.post(status_url, params=params, json=list(batch_ids), **timeout)
+        response.raise_for_status()
+        return {item["id"]: item for item in response.json()["data"]}
+
     def get_status(self, batch_id, wait=1):
         status_url = urllib.parse.urljoin(self.base_url, "batch_statuses")
         params = {
             "id": batch_id,
             "wait": wait,
         }
-        response = requests.get(status_url, params=params)
+        response = self.session.get(status_url, params=params)
         return response
 
+    def await_commit(self, batches):
+        """
+        Wait for @batches, {batch_id: IDs of its transactions}, if this operation waits on every
+        submission, else leave them to `barrier`. Batches still pending after the wait are left to `barrier` too.
+        """
+        self.outstanding.update(batches)
+        if not self.wait:
+            return
+        try:
+            print("Retrieving batch status...")
+            with COMMIT_WAIT_SECONDS.time():
+                statuses = self.verify_batch_commit_status(",".join(batches))
+        except requests.RequestException as e:
+            print(e)
+            return
+        self.settle_batches(statuses)
+
+    def settle_batches(self, statuses):
+        "Settle the transactions of the outstanding batches whose @statuses {batch_id: status} are final."
+        for batch_id, status in statuses.items():
+            if status in ("COMMITTED", "INVALID") and batch_id in self.outstanding:
+                self.settle(self.outstanding.pop(batch_id))
+
+    def barrier(self, timeout=constant.BARRIER_TIMEOUT):
+        """
+        Wait until every batch submitted without waiting is COMMITTED or INVALID, or @timeout expires.
+        Return:
+            %statuses: {batch_id: status}; batches still unsettled stay outstanding
+        """
+        deadline = time.monotonic() + timeout
+        statuses = {}
+        pending = list(self.outstanding)
+        with COMMIT_WAIT_SECONDS.time():
+            while pending:
+                remaining = deadline - time.monotonic()
+                items = self.get_batch_statuses(pending, wait=max(1, int(remaining)))
+                for batch_id in pending:
+                    statuses[batch_id] = items.get(batch_id, {}).get("status", "UNKNOWN")
+                pending = [batch_id for batch_id in pending if statuses[batch_id] not in ("COMMITTED", "INVALID")]
+                if remaining <= 0:
+                    break
+        self.settle_batches(statuses)
+        return statuses
+
     def verify_batch_commit_status(self, batch_id, wait=2):
+        """
+        Return:
+            %statuses: {batch_id: status} of the comma separated @batch_id, once none is PENDING or after @wait seconds
+        """
         start_time = time.monotonic()
         wait_time = 0
         while wait_time < wait:
             response = self.get_status(batch_id, wait - wait_time)
-            status = response.json()["data"][0]["status"]
-            print(status)
-            if status != "PENDING":
-                return True
+            statuses = {item["id"]: item["status"] for item in response.json()["data"]}
+            print(*statuses.values())
+            if "PENDING" not in statuses.values():
+                break
             wait_time = time.monotonic() - start_time
+        return statuses
+
+
+class BatchBuilder:
+    """
+    Pack the transactions of many operations into batches of at most @max_batch_size
+    transactions, sign every batch once and submit all of them in a single BatchList.
+    With a `SigningPool` @pool, or with @defer, operations are queued unsigned and signed
+    together (on the pool's workers if any) when the builder flushes; until then they return
+    (None, None). A `Submitter` signs the operations of a deferring builder only once a batch
+    slot is free, so they depend on the transactions in flight at that time.
+    An operation issued again with the `idempotency_key` of one this builder queued is not queued twice.
+    """
+    def __init__(self, oper, max_batch_size=constant.MAX_BATCH_SIZE, autoflush=True, pool=None, defer=False):
+        self.oper = oper
+        self.max_batch_size = max_batch_size
+        self.autoflush = autoflush
+        self.pool = pool
+        self.defer = defer or pool is not None
+        self.txns = []
+        self.txids = []
+        self.keys = set()  # idempotency keys of the operations queued so far
+
+    def __enter__(self):
+        self.oper.batcher = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.oper.batcher = None
+        if exc_type is None and self.autoflush:
+            self.flush()
+
+    def add(self, txn, idempotency_key=None):
+        self.txns.append(txn)
+        if idempotency_key is not None:
+            self.keys.add(idempotency_key)
+
+    def sign(self):
+        "Sign the queued operations, return the transactions."
+        self.txns = self.oper.sign_transactions(self.txns, self.pool)
+        return self.txns
+
+    def flush(self):
+        """
+        Return:
+            %txids: list of (transaction ID, batch ID) in the order operations were added
+        """
+        if not self.txns:
+            return []
+        batches = {}
+        txids = []
+        signed = self.sign()
+        try:
+            for batch_id, batch in self.oper.generate_batches(signed, self.max_batch_size, self.pool):
+                batches[batch_id] = batch
+                txids.extend((txn.header_signature, batch_id) for txn in batch.transactions)
+            self.txns = []
+            self.oper.request_txs(BatchList(batches=list(batches.values())).SerializeToString())
+        except Exception:
+            self.oper.rollback(txn.header_signature for txn in signed)
+            raise
+        self.oper.await_commit({
+            batch_id: [txn.header_signature for txn in batch.transactions] for batch_id, batch in batches.items()
+        })
+        self.txids = txids
+        return txids
+
+
+def merge_shards(accounts):
+    """
+    Fold the (address, account) state records of each sharded account, which are adjacent
+    in address order, into one record at the account's address with the summed balance.
+    """
+    for _, group in itertools.groupby(accounts, key=lambda item: addressing.stem(item[0])):
+        group = list(group)
+        if len(group) == 1:
+            yield group[0]
+            continue
+        name = group[0][1]["name"]
+        yield addressing.get_address(name), {"name": name, "balance": sum(account["balance"] for _, account in group)}
 
 
 class Admin:
-    def __init__(self):
-        self.oper = Operation()
-        self.cache_path = pathlib.Path("cache")
+    def __init__(self, shards=None):
+        self.oper = Operation(shards=shards)
+        self.store = get_store()
+        get_write_behind().flush()  # Wallet writes still held in memory would otherwise land on top of ours
 
     def lst(self, check=False):
-        data = self.oper.get_list()
-        data = self.parse(data)
+        accounts = self.oper.iter_accounts()
         if check:
-            self.sync(data)
-        info_str = "All accounts' information: \n"
-        acc_info = []
-        for name, value in data.items():
-            acc_info.append(f"Account name: {name}, balance: ${value['balance']}\n")
-        info_str = ''.join([info_str, *acc_info])
-        logger.info(info_str)
-    
-    def parse(self, data):
-        " Parse dict struct {address: {name: , balance: }} into {name: {address: , balance:}}"
-        n_dict = {}
-        for address, value in data.items():
-            name = value["name"]
-            balance = value["balance"]
-            n_dict[name] = {
-                "address": address,
-                "balance": balance,
-            }
-        return n_dict
+            accounts = self.sync(accounts)
+        logger.info("All accounts' information: ")
+        for address, value in merge_shards(accounts):
+            logger.info(f"Account name: {value['name']}, balance: ${value['balance']}")
 
-    def sync(self, data):
-        for name, value in data.items():
-            account_info = {
-                "name": name,
-                "balance": value["balance"],
-            }
-            cache_file = self.cache_path / f"{name}.json"
-            f = open(cache_file, "w")
-            json.dump(account_info, f)
-            f.close()
-            logger.info(f"Account {name} is synchronized")
-        logger.info(f"All accounts are synchronized")
+    def reconcile(self, workers=constant.RECONCILE_WORKERS, chunk_size=constant.SYNC_CHUNK):
+        """
+        Check every cached balance against chain state, @workers reads in flight at a time,
+        and write back only the accounts that differ. Accounts missing on chain are dropped.
+        Every account is read by its address stem and its shards summed, so sharded accounts
+        are checked whatever their shard count and whether or not the store knows they are sharded.
+        Return:
+            %stats: checked/drifted/missing counts, total and max absolute drift, elapsed seconds
+        """
+        start = time.monotonic()
+        stats = {"checked": 0, "drifted": 0, "missing": 0, "total_drift": 0, "max_drift": 0}
+        # Snapshot the rows first: writing through the connection while its cursor is open is undefined in SQLite.
+        accounts = iter(list(self.store))
+        while True:
+            chunk = list(itertools.islice(accounts, chunk_size))
+            if not chunk:
+                break
+            names = [account["name"] for account in chunk]
+            balances = self.oper.get_balances(names, workers=workers, sharded=names)
+            rows = []
+            missing = []
+            for account in chunk:
+                balance = balances[account["name"]]
+                if balance is None:
+                    missing.append(account["address"])
+                elif balance != account["balance"]:
+                    drift = abs(balance - account["balance"])
+                    stats["total_drift"] += drift
+                    stats["max_drift"] = max(stats["max_drift"], drift)
+                    rows.append((account["name"], account["address"], balance))
+            self.store.apply_delta(rows, missing)
+            stats["checked"] += len(chunk)
+            stats["drifted"] += len(rows)
+            stats["missing"] += len(missing)
+        stats["elapsed"] = time.monotonic() - start
+        logger.info(
+            f"Reconciled {stats['checked']} accounts in {stats['elapsed']:.2f}s: {stats['drifted']} drifted "
+            f"(total ${stats['total_drift']}, max ${stats['max_drift']}), {stats['missing']} missing on chain"
+        )
+        return stats
+
+    def sync(self, accounts, chunk_size=constant.SYNC_CHUNK):
+        "Write streamed (address, account) state records into the store @chunk_size at a time, passing them through."
+        rows = []
+        count = 0
+        for address, value in accounts:
+            rows.append((value["name"], address, value["balance"]))
+            if len(rows) >= chunk_size:
+                self.store.apply_states(rows, ())
+                count += len(rows)
+                rows = []
+            yield address, value
+        self.store.apply_states(rows, ())
+        count += len(rows)
+        logger.info(f"All {count} accounts are synchronized")
 
 
 class Wallet:
-    def __init__(self, name):
+    def __init__(self, name, shards=None):
+        "@shards maps the names of sharded accounts to their shard count, see `Operation.shard_count`."
         self.name = name
-        self.cache_file = pathlib.Path(f"cache/{self.name}.json")
-        self.oper = Operation()
+        self.oper = Operation(shards=shards)
+        self.store = get_write_behind()
         
     def create(self, balance=0, force=False):
-        if self.cache_file.exists() and not force:  # An existing account
+        if self.store.get(self.name) is not None and not force:  # An existing account
             attrs = self.load()
         else:  # A new account
             self.balance = balance
@@ -297,9 +819,13 @@ class Wallet:
             self.cache()
             logger.info(f"New account {self.name} created with balance {self.balance}")
 
-    def check_balance(self):
-        balance = self.query_balance()
-        if balance != self.balance:
+    def check_balance(self, balance=None):
+        "Compare the cached balance with @balance, read from the chain if not given."
+        if balance is None:
+            balance = self.query_balance()
+        if balance is None:
+            logger.warning(f"Account {self.name} does not exist in blockchain")
+        elif balance != self.balance:
             logger.info(f"Balance in cache (${self.balance}) is not same as in blockchain (${balance}). Re-Synchronizing...")
             self.balance = balance
             self.cache() 
@@ -310,17 +836,22 @@ class Wallet:
             self.cache()
         return wrapper
 
-    def query(self, key):
-        query_func = f"query_{key}"
-        value = getattr(self, query_func)()
+    def query(self, key, local=False):
+        "Query @key from the chain, or from the local store kept current by `CacheSync` if @local."
+        if local:
+            attrs = self.store.get(self.name)
+            if attrs is None:
+                logger.info(f"Account {self.name} does not exists in local cache")
+                return None
+            value = attrs[key]
+        else:
+            query_func = f"query_{key}"
+            value = getattr(self, query_func)()
         logger.info(f"Account {self.name} has {key} value of {value}")
         return value
 
     def query_balance(self):
-        data = self.oper.get_balance(self.name)
-        value_bytes = base64.b64decode(data[0]["data"][0])
-        balance = struct.unpack("<I", value_bytes)[0]
-        return balance
+        return self.oper.get_balance(self.name)
     
     @auto_cache
     def deposit(self, amount):
@@ -348,32 +879,45 @@ class Wallet:
             dst.cache()
             logger.info(f"Transfer ${amount} from {self.name} to {dst.name}, new balance: {self.name}:${self.balance}, {dst.name}:${dst.balance}")
 
+    def multi_transfer(self, legs):
+        "Once the transfer is COMMITTED, update the cached balance of every loaded wallet among the sender and @legs."
+        total = sum(amount for _, amount in legs)
+        try:
+            _, batch_id = self.oper.multi_transfer(self, legs)
+        except InvalidTransaction as e:
+            logger.error("Transfer failed! Internal exception")
+        except constant.OutOfBalanceException as e:
+            logger.error(f"Account {self.name} does not have enough money ({total})!")
+        else:
+            status = self.oper.check_batch_status(batch_id)
+            if status != "COMMITTED":
+                logger.error(f"Transfer from {self.name} to {len(legs)} accounts is {status}, cached balances are left unchanged")
+                return
+            for wallet, change in [(self, -total), *legs]:
+                if getattr(wallet, "balance", None) is None:  # Not in the local cache
+                    continue
+                wallet.balance += change
+                wallet.cache()
+            logger.info(f"Transfer ${total} from {self.name} to {len(legs)} accounts committed")
+
     def purge(self):
         logger.info(f"NOTE: This will purge the account completely, all balance will be liquidated.")
         self.oper.purge(self.name)
-        self.cache_file.unlink()
+        self.store.delete(self.name)
     
     def cache(self):
-        attrs = {
-            "balance": self.balance,
-        }
-        with open(self.cache_file, "w") as f:
-            json.dump(attrs, f)
+        self.store.upsert(self.name, self.oper.get_address(self.name), self.balance)
 
     def load(self, check=False):
-        try:
-            f = open(self.cache_file, "r")
-            attrs = json.load(f)
-        except (FileNotFoundError, EOFError, json.decoder.JSONDecodeError):
-            logger.info(f"Account {self.name} does not exists or has been damaged in local cache, try to sychronize with blockchain.")
+        attrs = self.store.get(self.name)
+        if attrs is None:
+            logger.info(f"Account {self.name} does not exists in local cache, try to sychronize with blockchain.")
         else:
             logger.info(f"Loaded an exising account named {self.name}")
             self.balance = attrs["balance"]
             if check:
                 self.check_balance()
                 logger.info(f"Balance checked -- ${self.balance}!")
-        finally:
-            f.close()
         return attrs
 
 
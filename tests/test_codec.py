@@ -0,0 +1,56 @@
+import pytest
+
+from src import codec
+
+PAYLOADS = [
+    {"typ": "create", "name": "alice", "balance": 10},
+    {"typ": "transfer", "sender": "alice", "receiver": "bob", "amount": 5},
+    {"typ": "change", "name": "alice", "amount": -3},
+    {"typ": "query", "name": "alice", "key": "balance"},
+    {"typ": "purge", "name": "alice"},
+    {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 1], ["carol", 2]]},
+    {"typ": "sharded_change", "name": "hot", "amount": 7, "shard": 3, "shards": 4},
+    {"typ": "sharded_transfer", "sender": "hot", "shards": 4, "receiver": "bob", "shard": 0, "amount": 1},
+    {"typ": "sharded_query", "name": "hot", "key": "balance", "shards": 4},
+    {"typ": "sharded_purge", "name": "hot", "shards": 4},
+]
+
+create = codec.encode_payload({"typ": "create", "name": "alice", "balance": 10}, "1.2")
+MALFORMED = {
+    "empty": b"",
+    "unknown op code": b"\xff",
+    "truncated integer": create[:-3],
+    "truncated string": create[:4],
+    "trailing bytes": create + b"\x00",
+    "invalid utf-8": bytes([5]) + (2).to_bytes(2, "little") + b"\xff\xfe",
+}
+
+
+@pytest.mark.parametrize("version", ["1.1", "1.2"])
+@pytest.mark.parametrize("payload", PAYLOADS, ids=lambda payload: payload["typ"])
+def test_payload_round_trip(payload, version):
+    assert codec.decode_payload(codec.encode_payload(payload, version), version) == payload
+
+
+@pytest.mark.parametrize("version", ["1.1", "1.2"])
+@pytest.mark.parametrize("balance", [0, 2 ** 40, -1])
+def test_account_round_trip(version, balance):
+    account = {"name": "ålice", "balance": balance}
+    assert codec.decode_account(codec.encode_account(account, version)) == account
+
+
+@pytest.mark.parametrize("data", MALFORMED.values(), ids=MALFORMED.keys())
+def test_malformed_payload(data):
+    with pytest.raises(ValueError):
+        codec.decode_payload(data, "1.2")
+
+
+def test_malformed_json_payload():
+    with pytest.raises(ValueError):
+        codec.decode_payload(b"{\"typ\": ", "1.1")
+
+
+def test_unknown_state_format():
+    data = codec.encode_account({"name": "alice", "balance": 1}, "1.2")
+    with pytest.raises(ValueError):
+        codec.decode_account(b"\x02" + data[1:])
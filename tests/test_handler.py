@@ -0,0 +1,65 @@
+import pytest
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from bank_tp import TransferTransactionHandler
+from src import codec
+from src.addressing import get_address
+from src.context import MemoryContext, make_request
+
+VERSION = "1.2"
+
+REJECTED = {
+    "transfer overdraft": {"typ": "transfer", "sender": "alice", "receiver": "bob", "amount": 11},
+    "transfer from missing sender": {"typ": "transfer", "sender": "nobody", "receiver": "bob", "amount": 1},
+    "transfer to missing receiver": {"typ": "transfer", "sender": "alice", "receiver": "nobody", "amount": 1},
+    "transfer to self": {"typ": "transfer", "sender": "alice", "receiver": "alice", "amount": 1},
+    "transfer of zero": {"typ": "transfer", "sender": "alice", "receiver": "bob", "amount": 0},
+    "transfer of negative amount": {"typ": "transfer", "sender": "alice", "receiver": "bob", "amount": -1},
+    "multi_transfer overdraft": {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 6], ["carol", 5]]},
+    "multi_transfer from missing sender": {"typ": "multi_transfer", "sender": "nobody", "receivers": [["bob", 1]]},
+    "multi_transfer to missing receiver": {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 1], ["nobody", 1]]},
+    "multi_transfer to self": {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 1], ["alice", 1]]},
+    "multi_transfer zero leg": {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 1], ["carol", 0]]},
+    "multi_transfer negative leg": {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 2], ["carol", -1]]},
+    "withdraw overdraft": {"typ": "change", "name": "alice", "amount": -11},
+    "deposit to missing account": {"typ": "change", "name": "nobody", "amount": 1},
+    "query of missing account": {"typ": "query", "name": "nobody", "key": "balance"},
+    "sharded withdraw overdraft": {"typ": "sharded_change", "name": "alice", "amount": -11, "shard": 0, "shards": 4},
+    "sharded transfer overdraft": {
+        "typ": "sharded_transfer", "sender": "alice", "shards": 4, "receiver": "bob", "shard": 1, "amount": 11,
+    },
+}
+
+
+@pytest.fixture
+def handler():
+    return TransferTransactionHandler()
+
+
+@pytest.fixture
+def context(handler):
+    context = MemoryContext()
+    for name, balance in [("alice", 10), ("bob", 5), ("carol", 0)]:
+        apply(handler, context, {"typ": "create", "name": name, "balance": balance})
+    return context
+
+
+def apply(handler, context, op):
+    handler.apply(make_request(codec.encode_payload(op, VERSION), VERSION), context)
+
+
+def balance(context, name):
+    return codec.decode_account(context.state[get_address(name)])["balance"]
+
+
+def test_multi_transfer(handler, context):
+    apply(handler, context, {"typ": "multi_transfer", "sender": "alice", "receivers": [["bob", 3], ["carol", 7]]})
+    assert [balance(context, name) for name in ("alice", "bob", "carol")] == [0, 8, 7]
+
+
+@pytest.mark.parametrize("op", REJECTED.values(), ids=REJECTED.keys())
+def test_rejected(handler, context, op):
+    before = dict(context.state)
+    with pytest.raises(InvalidTransaction):
+        apply(handler, context, op)
+    assert context.state == before
@@ -0,0 +1,28 @@
+import asyncio
+
+from sawtooth_signing import create_context, CryptoFactory
+
+from src.bulk import run
+from src.devnet import Devnet, serve
+from src.wallet import Operation
+
+
+def test_invalid_line_does_not_sink_its_batch():
+    devnet = Devnet(latency=0.05, seed=0)
+    server = serve(devnet)
+    try:
+        context = create_context('secp256k1')
+        signer = CryptoFactory(context).new_signer(context.new_random_private_key())
+        oper = Operation(signer=signer, base_url=f"http://127.0.0.1:{server.server_port}")
+        lines = ["create,alice,10", "create,bob,0", "withdraw,alice,99999999", *["deposit,bob,1"] * 15]
+        results = []
+        counts = asyncio.run(run(lines, oper, max_batch_size=4, out=results.append))
+
+        assert counts == {"COMMITTED": 17, "INVALID": 1}
+        assert any(result.startswith("3\twithdraw\tINVALID") for result in results)
+        assert oper.get_balance("alice") == 10
+        assert oper.get_balance("bob") == 15
+        assert not oper.last_txids
+    finally:
+        server.shutdown()
+        devnet.stop()
@@ -0,0 +1,43 @@
+import random
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+from sawtooth_signing import create_context, CryptoFactory
+
+from src.bulk import Account
+from src.signer import SigningPool
+from src.wallet import Operation
+
+
+def build(signer, ops, pool=None):
+    "Sign @ops into batches of 50 transactions, return the BatchList."
+    oper = Operation(signer=signer, session=object())
+    oper.nonce_prefix = "test."
+    with oper.batch(max_batch_size=50, autoflush=False, pool=pool) as builder:
+        for op, args in ops:
+            getattr(oper, op)(*args)
+    batches = oper.generate_batches(builder.sign(), builder.max_batch_size, pool)
+    return BatchList(batches=[batch for _, batch in batches])
+
+
+def test_pooled_signing_matches_serial():
+    rng = random.Random(0)
+    accounts = [f"account-{i}" for i in range(20)]
+    ops = []
+    for _ in range(300):
+        if rng.random() < 0.5:
+            ops.append(("deposit", (rng.choice(accounts), rng.randint(1, 100))))
+        else:
+            src, dst = rng.sample(accounts, 2)
+            ops.append(("transfer_money", (Account(src), Account(dst), rng.randint(1, 100))))
+    context = create_context('secp256k1')
+    signer = CryptoFactory(context).new_signer(context.new_random_private_key())
+
+    serial = build(signer, ops)
+    with SigningPool(signer, workers=2, chunk_size=16) as pool:
+        pooled = build(signer, ops, pool)
+
+    assert pooled.SerializeToString() == serial.SerializeToString()
+    headers = [TransactionHeader.FromString(txn.header) for batch in serial.batches for txn in batch.transactions]
+    assert len(headers) == len(ops)
+    assert any(header.dependencies for header in headers)
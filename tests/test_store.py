@@ -0,0 +1,47 @@
+import itertools
+
+import pytest
+
+from src.addressing import get_address, shard_addresses
+from src.store import AccountStore
+
+# Address ends in byte 0xfe, so shards 2 and 3 wrap to 0x00 and 0x01 and sort before the account's own address
+NAME = next(name for name in (f"hot-{i}" for i in itertools.count()) if get_address(name).endswith("fe"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AccountStore(tmp_path / "accounts.db")
+
+
+def states(balances, name=NAME):
+    "State records of the shards of @name holding @balances, in address order as the chain returns them."
+    return sorted(zip(itertools.repeat(name), shard_addresses(name, len(balances)), balances), key=lambda row: row[1])
+
+
+def test_shards_before_primary_are_summed(store):
+    rows = states([10, 20, 30, 40])
+    assert rows[0][1] != get_address(NAME)
+    store.apply_states(rows, ())
+    assert store.get(NAME) == {"name": NAME, "address": get_address(NAME), "balance": 100}
+
+
+def test_cached_account_becomes_sharded(store):
+    store.apply_states([(NAME, get_address(NAME), 5)], ())
+    store.apply_states(states([10, 20, 30, 40]), ())
+    assert store.get(NAME)["balance"] == 100
+
+
+def test_one_shard_changes(store):
+    store.apply_states(states([10, 20, 30, 40]), ())
+    store.apply_states([states([10, 20, 35, 40])[0]], ())
+    assert store.get(NAME)["balance"] == 105
+
+
+def test_deleted_shards(store):
+    store.apply_states(states([10, 20, 30, 40]), ())
+    addresses = shard_addresses(NAME, 4)
+    store.apply_states((), [addresses[2]])
+    assert store.get(NAME)["balance"] == 70
+    store.apply_states((), addresses)
+    assert store.get(NAME) is None